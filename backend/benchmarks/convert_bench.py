@@ -0,0 +1,77 @@
+"""
+Pages/second of the serial docling path vs parallel page-range conversion.
+
+Usage (from backend/):
+    python -m benchmarks.convert_bench path/to/book.pdf --workers 4 --pages-per-range 20
+
+Both runs are cold: every process pays the docling model load, exactly
+like the first upload after a server start.
+"""
+import argparse
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from rag.converter import convert_pages, convert_pdf, count_pages, page_ranges
+
+
+def run_serial(path):
+    # A single-worker pool so the model load is counted the same way
+    with ProcessPoolExecutor(
+        max_workers=1,
+        mp_context=multiprocessing.get_context("spawn"),
+    ) as pool:
+        start = time.perf_counter()
+        segment = pool.submit(convert_pdf, path).result()
+        elapsed = time.perf_counter() - start
+
+    return elapsed, len(segment["markdown"])
+
+
+def run_parallel(path, num_pages, workers, pages_per_range):
+    ranges = page_ranges(num_pages, pages_per_range)
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+    ) as pool:
+        start = time.perf_counter()
+        futures = [
+            pool.submit(convert_pages, path, first, last)
+            for first, last in ranges
+        ]
+        segments = [future.result() for future in futures]
+        elapsed = time.perf_counter() - start
+
+    return elapsed, sum(len(s["markdown"]) for s in segments), len(ranges)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("pdf")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--pages-per-range", type=int, default=20)
+    args = parser.parse_args()
+
+    num_pages = count_pages(args.pdf)
+    print(f"{args.pdf}: {num_pages} pages")
+
+    serial_time, serial_chars = run_serial(args.pdf)
+    print(
+        f"serial               {serial_time:8.1f}s  "
+        f"{num_pages / serial_time:6.2f} pages/s  {serial_chars} chars"
+    )
+
+    parallel_time, parallel_chars, num_ranges = run_parallel(
+        args.pdf, num_pages, args.workers, args.pages_per_range
+    )
+    print(
+        f"parallel x{args.workers} ({num_ranges} ranges) "
+        f"{parallel_time:8.1f}s  "
+        f"{num_pages / parallel_time:6.2f} pages/s  {parallel_chars} chars"
+    )
+    print(f"speedup: {serial_time / parallel_time:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Recall and latency of each FAISS index strategy against the flat baseline.
+
+Usage (from backend/):
+    python -m benchmarks.index_bench --vectors 200000 --dim 768
+    python -m benchmarks.index_bench --index document_cache/<sha256>/indexes/<key>
+
+Synthetic vectors are drawn from a Gaussian mixture so they cluster like
+real chunk embeddings; --index benchmarks the vectors of a built index.
+Queries are held-out perturbed corpus vectors; recall@k is measured
+against exact (flat) search.
+"""
+import argparse
+import time
+
+import faiss
+import numpy as np
+
+from rag.index_factory import STRATEGIES, build_index
+
+
+def synthetic_vectors(n, dim, clusters=64, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32) * 4
+    labels = rng.integers(0, clusters, n)
+    return centers[labels] + rng.standard_normal((n, dim)).astype(np.float32)
+
+
+def index_vectors(path):
+    index = faiss.read_index(f"{path}/index.faiss")
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def recall_at_k(truth, found):
+    k = truth.shape[1]
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth, found))
+    return hits / (len(truth) * k)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--vectors", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--index", help="benchmark the vectors of a saved index")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=12)
+    parser.add_argument(
+        "--strategies", default=",".join(STRATEGIES),
+        help="comma-separated subset of " + ",".join(STRATEGIES),
+    )
+    args = parser.parse_args()
+
+    if args.index:
+        corpus = index_vectors(args.index)
+    else:
+        corpus = synthetic_vectors(args.vectors, args.dim)
+
+    rng = np.random.default_rng(1)
+    picks = rng.choice(len(corpus), min(args.queries, len(corpus)), replace=False)
+    queries = corpus[picks] + 0.1 * rng.standard_normal(
+        (len(picks), corpus.shape[1])
+    ).astype(np.float32)
+
+    print(f"{len(corpus)} vectors × {corpus.shape[1]} dims, "
+          f"{len(queries)} queries, k={args.k}")
+    print(f"{'strategy':10} {'build s':>8} {'ms/query':>9} "
+          f"{'recall@k':>9} {'size MB':>8}")
+
+    truth = None
+
+    for strategy in ["flat"] + [
+        s for s in args.strategies.split(",") if s != "flat"
+    ]:
+        start = time.perf_counter()
+        index, resolved = build_index(corpus, strategy)
+        index.add(corpus)
+        build_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        _, found = index.search(queries, args.k)
+        latency_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+        if truth is None:
+            truth = found
+
+        size_mb = faiss.serialize_index(index).nbytes / (1024 * 1024)
+        label = strategy if resolved == strategy else f"{strategy}→{resolved}"
+        print(f"{label:10} {build_time:8.2f} {latency_ms:9.3f} "
+              f"{recall_at_k(truth, found):9.3f} {size_mb:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
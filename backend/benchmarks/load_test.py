@@ -0,0 +1,130 @@
+"""
+Load test of the parse → generate → submit path against a running server.
+
+Usage (from backend/), with the offline providers so no API quota is spent:
+    LLM_PROVIDER=fake EMBEDDING_PROVIDER=fake uvicorn main:app --port 8000
+    python -m benchmarks.load_test path/to/book.pdf --users 50 --quizzes 4
+
+The PDF is uploaded once; then --users virtual students each generate
+--quizzes quizzes and submit answers, all concurrently. Prints per-endpoint
+throughput and latency percentiles, 503 (backpressure) rejections, and the
+server's LLM provider metrics. FAKE_LLM_LATENCY / FAKE_LLM_TOKENS_PER_SECOND
+on the server shape the simulated model.
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def upload(client, path):
+    with open(path, "rb") as f:
+        res = await client.post(
+            "/parse-document",
+            files={"file": (path.rsplit("/", 1)[-1], f, "application/pdf")},
+        )
+    res.raise_for_status()
+    job_id = res.json()["job_id"]
+
+    start = time.perf_counter()
+    while True:
+        job = (await client.get(f"/jobs/{job_id}")).json()
+        if job["status"] == "done":
+            print(f"Parsed in {time.perf_counter() - start:.1f}s: {job['result']['chunks']} chunks")
+            return job["result"]["document_id"]
+        if job["status"] == "failed":
+            raise RuntimeError(f"Parsing failed: {job.get('error')}")
+        await asyncio.sleep(0.5)
+
+
+async def student(client, document_id, args, results):
+    payload = {
+        "num_questions": args.num_questions,
+        "difficulty": args.difficulty,
+        "question_type": args.question_type,
+        "document_ids": [document_id],
+    }
+
+    for _ in range(args.quizzes):
+        start = time.perf_counter()
+        res = await client.post("/generate-quiz", json=payload)
+        results["generate"].append((res.status_code, time.perf_counter() - start))
+        if res.status_code != 200:
+            continue
+
+        quiz = res.json()
+        answers = [
+            {
+                "question_index": i,
+                "user_answer": (q.get("options") or ["I am not sure"])[0],
+            }
+            for i, q in enumerate(quiz["questions"])
+        ]
+        start = time.perf_counter()
+        res = await client.post(
+            "/submit-quiz", json={"quiz_id": quiz["quiz_id"], "answers": answers}
+        )
+        results["submit"].append((res.status_code, time.perf_counter() - start))
+
+
+def report(name, samples, wall_s):
+    ok = [elapsed for status, elapsed in samples if status == 200]
+    rejected = sum(1 for status, _ in samples if status == 503)
+    failed = len(samples) - len(ok) - rejected
+    print(
+        f"{name:<10} {len(samples):>6} {len(ok):>6} {rejected:>6} {failed:>6} "
+        f"{len(ok) / wall_s:>8.2f} {percentile(ok, 0.5) * 1000:>9.0f} "
+        f"{percentile(ok, 0.95) * 1000:>9.0f} {max(ok, default=0) * 1000:>9.0f}"
+    )
+
+
+async def run(args):
+    limits = httpx.Limits(max_connections=args.users * 2)
+    async with httpx.AsyncClient(
+        base_url=args.url, timeout=args.timeout, limits=limits
+    ) as client:
+        document_id = await upload(client, args.pdf)
+
+        results = {"generate": [], "submit": []}
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            student(client, document_id, args, results) for _ in range(args.users)
+        ))
+        wall_s = time.perf_counter() - start
+
+        print(f"\n{args.users} users x {args.quizzes} quizzes in {wall_s:.1f}s\n")
+        print(
+            f"{'endpoint':<10} {'sent':>6} {'ok':>6} {'503':>6} {'failed':>6} "
+            f"{'ok/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}"
+        )
+        for name, samples in results.items():
+            report(name, samples, wall_s)
+
+        metrics = (await client.get("/metrics")).json()
+        print("\nLLM provider:", metrics.get("llm"))
+        print("Question bank:", metrics.get("question_bank"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("pdf")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--quizzes", type=int, default=3, help="quizzes per user")
+    parser.add_argument("--num-questions", type=int, default=5)
+    parser.add_argument("--difficulty", default="Medium")
+    parser.add_argument("--question-type", default="MCQ")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
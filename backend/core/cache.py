@@ -4,8 +4,13 @@ import uuid
 QUIZ_CACHE = {}
 
 
-def store_quiz(quiz):
-    quiz_id = str(uuid.uuid4())
+def new_quiz_id():
+    return str(uuid.uuid4())
+
+
+def store_quiz(quiz, quiz_id=None):
+    # Streaming generation issues the id before the quiz exists
+    quiz_id = quiz_id or new_quiz_id()
     QUIZ_CACHE[quiz_id] = quiz
     return quiz_id
 
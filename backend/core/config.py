@@ -1,4 +1,153 @@
-VECTOR_DB_PATH = "faiss_index"
+import os
+
+# Content-addressed cache: conversions + FAISS indexes keyed by SHA-256 of the upload
+DOCUMENT_CACHE_DIR = "document_cache"
+
+# Document registry (document_id → index) and the resident-index LRU budget
+LIBRARY_PATH = os.path.join(DOCUMENT_CACHE_DIR, "library.json")
+INDEX_CACHE_MAX_BYTES = 512 * 1024 * 1024   # 512 MiB of loaded FAISS indexes
+
+# Embedding backend: "google" (Gemini API), "local" (sentence-transformers
+# on CPU — no network, same model quiz/semantic.py already loads) or "fake"
+# (deterministic hashed bag-of-words, core/fake.py — benchmarks only)
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "google")
+GOOGLE_EMBEDDING_MODEL = "models/gemini-embedding-001"
+LOCAL_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+LOCAL_EMBED_BATCH_SIZE = 64
+FAKE_EMBEDDING_DIM = 256
+
+EMBEDDING_MODEL = {
+    "google": GOOGLE_EMBEDDING_MODEL,
+    "local": LOCAL_EMBEDDING_MODEL,
+    "fake": f"fake-hash-{FAKE_EMBEDDING_DIM}",
+}.get(EMBEDDING_PROVIDER, EMBEDDING_PROVIDER)
+
+# Chat backend: "google" (Gemini) or "fake" (offline quiz JSON built from
+# the prompt's context, core/fake.py — load tests without API quota)
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "google")
+FAKE_LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", "0.5"))            # seconds to first token
+FAKE_LLM_TOKENS_PER_SECOND = float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "150"))  # output speed
+
+# Chunk-level embedding cache shared by every document, revision and query
+EMBEDDING_CACHE_PATH = "embedding_cache.sqlite3"
+EMBEDDING_CACHE_MAX_ENTRIES = 200_000
 
 CHUNK_SIZE = 900
-CHUNK_OVERLAP = 200
\ No newline at end of file
+CHUNK_OVERLAP = 200
+
+# "structure" chunks along the docling element tree (sections, tables,
+# lists) and records section/page metadata; "recursive" is the flat
+# character splitter over the joined markdown
+CHUNKING_STRATEGY = "structure"
+CHUNKER_VERSION = 3   # bump when chunk boundaries or metadata change (re-chunks cached indexes)
+
+# Uploads are streamed to disk in fixed-size chunks; larger files are rejected
+UPLOAD_CHUNK_SIZE = 1024 * 1024          # 1 MiB
+MAX_UPLOAD_BYTES = 100 * 1024 * 1024     # 100 MiB
+UPLOAD_FORM_OVERHEAD = 64 * 1024        # multipart boundaries + form fields allowed on top
+
+# Ingestion jobs — docling conversion and embedding run in a process pool
+INGEST_WORKERS = min(4, os.cpu_count() or 1)
+JOB_TTL_SECONDS = 60 * 60          # finished jobs stay pollable this long
+JOB_MAX_FINISHED = 1000            # and at most this many are kept
+
+# PDFs with at least this many pages are converted as parallel page ranges
+CONVERT_PARALLEL_MIN_PAGES = 40
+CONVERT_PAGES_PER_RANGE = 20
+
+# Parsing modes: "auto" uses the PDF text layer where it is adequate and
+# docling (layout, tables, OCR) only for the remaining pages; "fast" uses
+# the text layer only; "full" sends every page through docling
+DEFAULT_PARSE_MODE = "auto"
+FASTPATH_MIN_CHARS_PER_PAGE = 200
+FASTPATH_MIN_CLEAN_RATIO = 0.95
+
+# FAISS index strategy: "auto" picks by vector count, or force one of
+# "flat" (exact), "hnsw", "ivf_flat", "ivf_pq"
+INDEX_STRATEGY = "auto"
+INDEX_FLAT_MAX_VECTORS = 20_000
+INDEX_HNSW_MAX_VECTORS = 500_000
+INDEX_IVF_FLAT_MAX_VECTORS = 2_000_000
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64               # search-time: higher = better recall, slower
+IVF_NPROBE = 16                   # search-time: inverted lists probed per query
+IVF_TRAIN_SAMPLE_SIZE = 100_000   # k-means training sample for IVF indexes
+IVF_PQ_M = 64                     # PQ sub-quantizers (largest divisor of dim ≤ this)
+
+# Embedding pipeline for index builds
+EMBED_BATCH_SIZE = 64
+EMBED_MAX_IN_FLIGHT = 4           # batches awaiting the provider at once
+EMBED_REQUESTS_PER_MINUTE = 120   # token-bucket limit on remote batch requests
+EMBED_MAX_RETRIES = 5             # per batch, with jittered exponential backoff
+
+# Retrieval for quizzes without a topic: "coverage" draws least-used chunks
+# stratified by section/position (no vector search); "search" runs the
+# random query pool against the index
+RETRIEVAL_STRATEGY = "coverage"
+SAMPLER_MIN_SECTIONS = 4          # fewer sections → stratify by position instead
+SAMPLER_POSITION_BUCKETS = 8
+
+# Topic quizzes: topic vectors are cached (LRU) and retrieved with MMR for
+# diverse on-topic chunks; no topic falls back to RETRIEVAL_STRATEGY
+TOPIC_CACHE_SIZE = 256
+TOPIC_FETCH_K = 40                # candidates MMR re-ranks per document
+TOPIC_MMR_LAMBDA = 0.5            # 1 = pure relevance, 0 = pure diversity
+
+# Topic search: "vector" (MMR over embeddings), "lexical" (BM25 only — no
+# embedding call) or "hybrid" (reciprocal-rank fusion of BM25 and vector hits)
+TOPIC_SEARCH_MODE = "hybrid"
+RRF_K = 60
+BM25_K1 = 1.5
+BM25_B = 0.75
+BM25_CACHE_SIZE = 16              # BM25 indexes kept in memory
+
+# Prompt context: retrieved chunks are merged (overlap stripped) and packed
+# to a token budget that grows with the number of questions
+CHARS_PER_TOKEN = 4               # rough estimate for budgeting
+CONTEXT_BASE_TOKENS = 400
+CONTEXT_TOKENS_PER_QUESTION = 250
+CONTEXT_MAX_TOKENS = 8000
+
+# Quiz generation is split into shards of up to QUIZ_SHARD_SIZE questions,
+# each over its own slice of the context, generated concurrently
+QUIZ_SHARD_SIZE = 5
+QUIZ_MAX_CONCURRENT_SHARDS = 4
+QUIZ_SHARD_RETRIES = 2            # per shard, with jittered backoff
+
+# Question bank: questions pre-generated per (document, difficulty, type)
+# after parsing, served instantly and refilled in the background
+QUESTION_BANK_PATH = "question_bank.sqlite3"
+BANK_TARGET_SIZE = 30             # questions a pool is refilled up to
+BANK_LOW_WATERMARK = 10           # refill is queued when a pool drops below this
+BANK_REFILL_BATCH = 10            # questions per background generation call
+BANK_PREFILL = [                  # pools filled right after a document is parsed
+    ("Medium", "MCQ"),
+    ("Medium", "True/False"),
+    ("Medium", "Short Answer"),
+]
+
+# Near-duplicate question filter: generated questions are embedded with the
+# local sentence model and rejected when too close to one already asked
+# about the same document (kept per document under document_cache/)
+QUESTION_DEDUP_MODEL = LOCAL_EMBEDDING_MODEL
+QUESTION_DEDUP_THRESHOLD = 0.88   # cosine similarity counted as a duplicate
+QUESTION_INDEX_MAX = 500          # past questions kept per document, oldest evicted
+QUESTION_INDEX_CACHE_SIZE = 32    # per-document question indexes kept in memory
+
+# Seeded quizzes: the generated quiz is cached under (documents, retrieved
+# chunks, request params, seed) so replaying a seed needs no LLM call
+QUIZ_REPLAY_CACHE_PATH = "quiz_replay_cache.sqlite3"
+QUIZ_REPLAY_CACHE_MAX_ENTRIES = 1000   # least-recently-used quizzes evicted beyond this
+
+# LLM provider (core/provider.py): every chat call waits for a concurrency
+# slot and the request/token buckets; callers beyond LLM_MAX_QUEUE waiting
+# are rejected at once (503 + Retry-After) instead of piling up timeouts
+LLM_MODEL = "gemini-2.5-flash"
+LLM_TEMPERATURE = 0.8
+LLM_MAX_CONCURRENCY = 8           # calls in flight at once
+LLM_REQUESTS_PER_MINUTE = 60      # token-bucket limit on calls
+LLM_TOKENS_PER_MINUTE = 250_000   # token-bucket limit on input + output tokens
+LLM_MAX_QUEUE = 32                # calls allowed to wait for a slot
+LLM_MAX_RETRIES = 3               # retryable errors (429, 5xx, timeouts), jittered backoff
+LLM_CALL_TIMEOUT = 120            # seconds per call
@@ -0,0 +1,208 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+
+from langchain_core.embeddings import Embeddings
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Disk-backed embedding cache in front of any LangChain embedding provider.
+
+    Vectors are keyed by (model, kind, sha256 of the text), so identical
+    chunks are embedded once no matter which document or revision they
+    come from. "kind" separates document and query vectors because
+    providers such as Gemini embed them with different task types.
+
+    The store is SQLite so the ingestion worker processes and the API
+    process share one cache. It is bounded to max_entries rows with
+    least-recently-used eviction, and keeps hit/miss counters.
+    """
+
+    def __init__(self, underlying, model_name, path, max_entries):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.path = path
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._count = 0
+
+    # -----------------------------
+    # STORAGE
+    # -----------------------------
+    def _connect(self):
+        # One connection per process — never reuse a handle across fork/spawn
+        if self._conn is None or self._pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    model TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    text_hash TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (model, kind, text_hash)
+                )
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_embeddings_last_used "
+                "ON embeddings (last_used)"
+            )
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS counters (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )
+            """)
+            conn.commit()
+
+            self._conn = conn
+            self._pid = os.getpid()
+            self._count = conn.execute(
+                "SELECT COUNT(*) FROM embeddings"
+            ).fetchone()[0]
+
+        return self._conn
+
+    def _lookup(self, kind, hashes):
+        conn = self._connect()
+        found = {}
+
+        # Stay well under SQLite's bound-parameter limit
+        for start in range(0, len(hashes), 500):
+            batch = hashes[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(
+                f"SELECT text_hash, vector FROM embeddings "
+                f"WHERE model = ? AND kind = ? AND text_hash IN ({placeholders})",
+                [self.model_name, kind, *batch],
+            ).fetchall()
+            for text_hash, blob in rows:
+                vector = array("f")
+                vector.frombytes(blob)
+                found[text_hash] = vector.tolist()
+
+        if found:
+            now = time.time()
+            conn.executemany(
+                "UPDATE embeddings SET last_used = ? "
+                "WHERE model = ? AND kind = ? AND text_hash = ?",
+                [(now, self.model_name, kind, h) for h in found],
+            )
+
+        return found
+
+    def _store(self, kind, items):
+        conn = self._connect()
+        now = time.time()
+
+        cursor = conn.executemany(
+            "INSERT OR IGNORE INTO embeddings "
+            "(model, kind, text_hash, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+            [
+                (self.model_name, kind, h, array("f", vector).tobytes(), now)
+                for h, vector in items
+            ],
+        )
+        self._count += max(cursor.rowcount, 0)
+
+        if self._count > self.max_entries:
+            self._evict(conn)
+
+    def _evict(self, conn):
+        # Other processes insert too — recount before deleting anything
+        self._count = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = self._count - self.max_entries
+
+        if excess <= 0:
+            return
+
+        # Trim an extra 5% so eviction doesn't run on every insert
+        excess += self.max_entries // 20
+        conn.execute(
+            "DELETE FROM embeddings WHERE rowid IN ("
+            "SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+            (excess,),
+        )
+        self._count = max(self._count - excess, 0)
+
+    def _bump(self, conn, hits, misses):
+        conn.executemany(
+            "INSERT INTO counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            [("hits", hits), ("misses", misses)],
+        )
+
+    # -----------------------------
+    # CACHED EMBEDDING
+    # -----------------------------
+    def _embed(self, kind, texts, embed_missing):
+        hashes = [hashlib.sha256(t.encode("utf-8")).hexdigest() for t in texts]
+
+        with self._lock:
+            cached = self._lookup(kind, list(dict.fromkeys(hashes)))
+            self._conn.commit()
+
+        # Unique texts that still need the provider, in first-seen order
+        missing = {}
+        for h, text in zip(hashes, texts):
+            if h not in cached and h not in missing:
+                missing[h] = text
+
+        if missing:
+            vectors = embed_missing(list(missing.values()))
+            fresh = list(zip(missing.keys(), vectors))
+            cached.update(fresh)
+        else:
+            fresh = []
+
+        with self._lock:
+            conn = self._connect()
+            if fresh:
+                self._store(kind, fresh)
+            self._bump(conn, len(texts) - len(missing), len(missing))
+            conn.commit()
+
+        return [cached[h] for h in hashes]
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        return self._embed("document", texts, self.underlying.embed_documents)
+
+    def embed_query(self, text):
+        return self._embed(
+            "query",
+            [text],
+            lambda missing: [self.underlying.embed_query(missing[0])],
+        )[0]
+
+    def stats(self):
+        with self._lock:
+            conn = self._connect()
+            counters = dict(conn.execute("SELECT name, value FROM counters"))
+            entries = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+        hits = counters.get("hits", 0)
+        misses = counters.get("misses", 0)
+        total = hits + misses
+
+        return {
+            "model": self.model_name,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / total, 3) if total else 0.0,
+        }
@@ -0,0 +1,217 @@
+"""
+Offline stand-ins for the Gemini chat and embedding models, selected with
+LLM_PROVIDER=fake / EMBEDDING_PROVIDER=fake. They make no network calls
+and need no API key, so the whole parse → quiz → submit path can be
+benchmarked and load-tested on a disconnected machine.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+import zlib
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from core.config import CHARS_PER_TOKEN
+
+_TOKEN = re.compile(r"\w+")
+_QUIZ_REQUEST = re.compile(
+    r"Generate EXACTLY (\d+) (\w+) (MCQ|True/False|Short Answer) questions"
+)
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+_STREAM_CHUNK_TOKENS = 4
+
+
+# -----------------------------
+# EMBEDDINGS
+# -----------------------------
+class HashEmbeddings(Embeddings):
+    """
+    Deterministic hashed bag-of-words vectors: each word adds ±1 to one of
+    `dim` buckets (CRC32, stable across processes), then the vector is
+    L2-normalised. Texts sharing words land close together, so retrieval
+    and topic search still behave sensibly in benchmarks.
+    """
+
+    def __init__(self, dim):
+        self.dim = dim
+
+    def _embed(self, text):
+        vector = [0.0] * self.dim
+        for token in _TOKEN.findall(text.lower()):
+            h = zlib.crc32(token.encode("utf-8"))
+            vector[h % self.dim] += 1.0 if (h >> 16) & 1 else -1.0
+
+        norm = sum(x * x for x in vector) ** 0.5
+        if not norm:
+            vector[0] = 1.0
+            return vector
+        return [x / norm for x in vector]
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+# -----------------------------
+# CHAT MODEL
+# -----------------------------
+def _estimate_tokens(text):
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def _document_content(prompt):
+    # The quiz and explanation prompts both end with the retrieved context
+    content = prompt.split("DOCUMENT CONTENT:", 1)[-1]
+    return content.split("\nTASK:", 1)[0]
+
+
+def _sentences(context):
+    sentences = []
+    for piece in _SENTENCE_SPLIT.split(context):
+        text = re.sub(r"[#*|`>_]+", " ", piece)
+        text = " ".join(text.split())[:200]
+        if len(text.split()) >= 6:
+            sentences.append(text)
+    return sentences or ["The material introduces its main subject and explains the key ideas."]
+
+
+def _concept(sentence):
+    words = [word.strip(".,;:()[]\"'") for word in sentence.split()]
+    return max(words, key=len).capitalize()
+
+
+def _split(sentence, rng):
+    # Prefix to ask about and the rest as the answer; the cut point varies
+    # so one sentence can back several distinct questions
+    words = sentence.split()
+    cut = rng.randint(max(2, len(words) // 3), max(2, 2 * len(words) // 3))
+    return " ".join(words[:cut]), " ".join(words[cut:])
+
+
+def _question(sentence, others, question_type, rng):
+    concept = _concept(sentence)
+    explanation = f'The material states: "{sentence}"'
+    prefix, rest = _split(sentence, rng)
+
+    if question_type == "MCQ":
+        distractors = [_split(other, rng)[1] for other in rng.sample(others, min(3, len(others)))]
+        while len(distractors) < 3:
+            distractors.append(f"None of the statements about {concept} apply ({len(distractors) + 1}).")
+        options = [rest] + distractors
+        rng.shuffle(options)
+        labelled = [f"{letter}) {text}" for letter, text in zip("ABCD", options)]
+        return {
+            "question": f'Which option correctly completes: "{prefix} ..."?',
+            "options": labelled,
+            "answer": labelled[options.index(rest)],
+            "explanation": explanation,
+            "concept": concept,
+        }
+
+    if question_type == "True/False":
+        true = rng.random() < 0.5
+        statement = sentence if true else f"It is not the case that {sentence[0].lower()}{sentence[1:]}"
+        return {
+            "question": f"True or False: {statement}",
+            "options": ["True", "False"],
+            "answer": "True" if true else "False",
+            "explanation": explanation,
+            "concept": concept,
+        }
+
+    return {
+        "question": f'Complete the statement: "{prefix} ..."',
+        "answer": rest,
+        "explanation": explanation,
+        "concept": concept,
+    }
+
+
+def fake_reply(prompt):
+    """
+    Response text for a prompt: schema-valid quiz JSON for quiz prompts
+    (questions built from sentences of the DOCUMENT CONTENT), a short
+    explanation otherwise. Deterministic per prompt.
+    """
+    rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).hexdigest())
+    sentences = _sentences(_document_content(prompt))
+
+    match = _QUIZ_REQUEST.search(prompt)
+    if match is None:
+        return f"The document explains this directly: {rng.choice(sentences)}"
+
+    num_questions, question_type = int(match.group(1)), match.group(3)
+    picks = rng.sample(sentences, min(num_questions, len(sentences)))
+    while len(picks) < num_questions:
+        picks.append(rng.choice(sentences))
+
+    questions = [
+        _question(sentence, [s for s in sentences if s != sentence], question_type, rng)
+        for sentence in picks
+    ]
+    return json.dumps({"questions": questions})
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model answering from fake_reply(). `latency` seconds pass before
+    the first token and output then arrives at `tokens_per_second`, for
+    both invoke and stream, so load tests see realistic call durations.
+    Token usage is estimated (CHARS_PER_TOKEN) and reported like Gemini's.
+    """
+
+    latency: float = 0.5
+    tokens_per_second: float = 150.0
+
+    @property
+    def _llm_type(self):
+        return "fake-quiz"
+
+    def _reply(self, messages):
+        prompt = "\n".join(str(message.content) for message in messages)
+        text = fake_reply(prompt)
+        usage = {
+            "input_tokens": _estimate_tokens(prompt),
+            "output_tokens": _estimate_tokens(text),
+        }
+        usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"]
+        return text, usage
+
+    def _duration(self, usage):
+        return self.latency + usage["output_tokens"] / self.tokens_per_second
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        text, usage = self._reply(messages)
+        time.sleep(self._duration(usage))
+        return ChatResult(generations=[
+            ChatGeneration(message=AIMessage(content=text, usage_metadata=usage))
+        ])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        text, usage = self._reply(messages)
+        await asyncio.sleep(self._duration(usage))
+        return ChatResult(generations=[
+            ChatGeneration(message=AIMessage(content=text, usage_metadata=usage))
+        ])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        text, usage = self._reply(messages)
+        step = _STREAM_CHUNK_TOKENS * CHARS_PER_TOKEN
+
+        await asyncio.sleep(self.latency)
+        for start in range(0, len(text), step):
+            await asyncio.sleep(_STREAM_CHUNK_TOKENS / self.tokens_per_second)
+            last = start + step >= len(text)
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content=text[start:start + step],
+                # Usage arrives with the final chunk, as with Gemini
+                usage_metadata=usage if last else None,
+            ))
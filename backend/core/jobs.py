@@ -0,0 +1,93 @@
+import asyncio
+import multiprocessing
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from core.config import INGEST_WORKERS, JOB_MAX_FINISHED, JOB_TTL_SECONDS
+
+# job_id → job status (stage, progress, error, result)
+JOBS = {}
+
+# Strong references so running tasks are not garbage collected mid-flight
+_background_tasks = set()
+
+_executor = None
+
+
+def get_executor():
+    """
+    Shared worker pool for CPU-heavy ingestion steps.
+    Uses "spawn" so workers never inherit the server's threads or gRPC state.
+    """
+    global _executor
+
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=INGEST_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def create_job():
+    job_id = str(uuid.uuid4())
+    now = time.time()
+    JOBS[job_id] = {
+        "job_id": job_id,
+        "status": "queued",       # queued → running → done | failed
+        "stage": "queued",
+        "progress": 0.0,
+        "error": None,
+        "result": None,
+        "created_at": now,
+        "updated_at": now,
+    }
+    return job_id
+
+
+def update_job(job_id, **fields):
+    job = JOBS.get(job_id)
+    if job is None:
+        return
+    job.update(fields)
+    job["updated_at"] = time.time()
+
+    if job["status"] in ("done", "failed"):
+        _evict_finished()
+
+
+def _evict_finished():
+    """
+    Drop finished jobs older than JOB_TTL_SECONDS, then the oldest beyond
+    JOB_MAX_FINISHED. Runs whenever a job finishes, so the table stays
+    bounded on a long-running server.
+    """
+    now = time.time()
+    finished = sorted(
+        (job for job in JOBS.values() if job["status"] in ("done", "failed")),
+        key=lambda job: job["updated_at"],
+    )
+
+    for i, job in enumerate(finished):
+        if now - job["updated_at"] > JOB_TTL_SECONDS or len(finished) - i > JOB_MAX_FINISHED:
+            del JOBS[job["job_id"]]
+
+
+def get_job(job_id):
+    return JOBS.get(job_id)
+
+
+def run_in_background(coro):
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
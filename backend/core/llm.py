@@ -5,21 +5,119 @@ from langchain_google_genai import (
 from dotenv import load_dotenv
 import os
 
+from core.config import (
+    EMBEDDING_PROVIDER,
+    EMBEDDING_MODEL,
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_CACHE_MAX_ENTRIES,
+    FAKE_EMBEDDING_DIM,
+    FAKE_LLM_LATENCY,
+    FAKE_LLM_TOKENS_PER_SECOND,
+    LLM_CALL_TIMEOUT,
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_QUEUE,
+    LLM_MAX_RETRIES,
+    LLM_MODEL,
+    LLM_PROVIDER,
+    LLM_REQUESTS_PER_MINUTE,
+    LLM_TEMPERATURE,
+    LLM_TOKENS_PER_MINUTE,
+)
+from core.embedding_cache import CachedEmbeddings
+from core.provider import LLMProvider
+
 load_dotenv()
 
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
-if not GOOGLE_API_KEY:
+# Only the Gemini backends need a key; "local" and "fake" run offline
+if not GOOGLE_API_KEY and "google" in (LLM_PROVIDER, EMBEDDING_PROVIDER):
     raise ValueError("GOOGLE_API_KEY is not set. Add it to your .env file.")
 
 
-embeddings = GoogleGenerativeAIEmbeddings(
-    model="models/gemini-embedding-001",
-    google_api_key=GOOGLE_API_KEY
+def _build_embeddings():
+    if EMBEDDING_PROVIDER == "google":
+        return GoogleGenerativeAIEmbeddings(
+            model=EMBEDDING_MODEL,
+            google_api_key=GOOGLE_API_KEY
+        )
+
+    if EMBEDDING_PROVIDER == "local":
+        # Imported lazily: loads torch + sentence-transformers
+        from core.local_embeddings import LocalEmbeddings
+        return LocalEmbeddings(EMBEDDING_MODEL)
+
+    if EMBEDDING_PROVIDER == "fake":
+        from core.fake import HashEmbeddings
+        return HashEmbeddings(FAKE_EMBEDDING_DIM)
+
+    raise ValueError(
+        f"Unknown EMBEDDING_PROVIDER {EMBEDDING_PROVIDER!r} "
+        f"(expected 'google', 'local' or 'fake')."
+    )
+
+
+def _build_llm():
+    if LLM_PROVIDER == "google":
+        return ChatGoogleGenerativeAI(
+            model=LLM_MODEL,
+            temperature=LLM_TEMPERATURE,
+            google_api_key=GOOGLE_API_KEY
+        )
+
+    if LLM_PROVIDER == "fake":
+        from core.fake import FakeChatModel
+        return FakeChatModel(
+            latency=FAKE_LLM_LATENCY,
+            tokens_per_second=FAKE_LLM_TOKENS_PER_SECOND,
+        )
+
+    raise ValueError(
+        f"Unknown LLM_PROVIDER {LLM_PROVIDER!r} (expected 'google' or 'fake')."
+    )
+
+
+# Every embed call (index builds + retrieval queries) goes through the cache
+embeddings = CachedEmbeddings(
+    _build_embeddings(),
+    model_name=EMBEDDING_MODEL,
+    path=EMBEDDING_CACHE_PATH,
+    max_entries=EMBEDDING_CACHE_MAX_ENTRIES,
+)
+
+llm = _build_llm()
+
+# Every chat call runs through the provider: concurrency + rate limits,
+# bounded wait queue, retries and metrics
+llm_provider = LLMProvider(
+    llm,
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    requests_per_minute=LLM_REQUESTS_PER_MINUTE,
+    tokens_per_minute=LLM_TOKENS_PER_MINUTE,
+    max_queue=LLM_MAX_QUEUE,
+    max_retries=LLM_MAX_RETRIES,
+    timeout=LLM_CALL_TIMEOUT,
 )
 
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash",
-    temperature=0.8,
-    google_api_key=GOOGLE_API_KEY
-)
\ No newline at end of file
+
+def structured_llm(schema):
+    """
+    Chat model constrained to a pydantic `schema` through the provider's
+    native JSON-schema output mode. Returns {"raw", "parsed",
+    "parsing_error"}: the raw message keeps token usage and the text to
+    salvage from when parsing fails. Plain `llm` if the model has no
+    structured-output support.
+    """
+    try:
+        return llm.with_structured_output(schema, method="json_schema", include_raw=True)
+    except NotImplementedError:
+        return llm
+
+
+def json_stream_llm(schema):
+    # Same JSON-schema mode for streaming, but still yielding text chunks
+    # (structured output only emits the object once it is complete)
+    return llm.bind(
+        response_mime_type="application/json",
+        response_json_schema=schema.model_json_schema(),
+    )
@@ -0,0 +1,43 @@
+from functools import lru_cache
+
+from langchain_core.embeddings import Embeddings
+from sentence_transformers import SentenceTransformer
+
+from core.config import LOCAL_EMBEDDING_MODEL, LOCAL_EMBED_BATCH_SIZE
+
+
+@lru_cache(maxsize=None)
+def get_sentence_model(name=LOCAL_EMBEDDING_MODEL):
+    """
+    One SentenceTransformer per model name per process, shared by answer
+    validation (quiz/semantic.py) and the local embedding backend.
+    """
+    return SentenceTransformer(name)
+
+
+class LocalEmbeddings(Embeddings):
+    """
+    In-process sentence-transformers embeddings for FAISS builds and queries.
+    Texts are encoded in CPU batches; vectors are L2-normalised so FAISS
+    L2 distance ranks the same as cosine similarity.
+    """
+
+    def __init__(self, model_name=LOCAL_EMBEDDING_MODEL, batch_size=LOCAL_EMBED_BATCH_SIZE):
+        self.model_name = model_name
+        self.batch_size = batch_size
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+
+        vectors = get_sentence_model(self.model_name).encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+        return vectors.tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
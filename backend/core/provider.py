@@ -0,0 +1,267 @@
+import asyncio
+import math
+import time
+from collections import deque
+
+from core.config import CHARS_PER_TOKEN
+from core.ratelimit import backoff_delay, per_minute
+
+# Transient failures named in an error's type or message. HTTP statuses
+# are read from the error itself, never guessed from digits in its text
+_RETRYABLE_MARKERS = (
+    "resource_exhausted", "resourceexhausted", "unavailable",
+    "deadline", "timeout", "timed out", "rate limit", "overloaded",
+)
+
+
+class LLMOverloaded(Exception):
+    """The provider's wait queue is full; retry after `retry_after` seconds."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"LLM is overloaded; retry in {retry_after}s.")
+        self.retry_after = retry_after
+
+
+def _retryable_types():
+    # Imported lazily: google-api-core ships with the Gemini client only
+    try:
+        from google.api_core import exceptions
+    except ImportError:
+        return (asyncio.TimeoutError, TimeoutError, ConnectionError)
+    return (
+        asyncio.TimeoutError, TimeoutError, ConnectionError,
+        exceptions.TooManyRequests, exceptions.ServerError,
+    )
+
+
+def _status(error):
+    # HTTP status carried by the error (SDK errors, google.api_core) or by
+    # its httpx response
+    for status in (
+        getattr(error, "status_code", None),
+        getattr(error, "code", None),
+        getattr(getattr(error, "response", None), "status_code", None),
+    ):
+        if isinstance(status, int) and not isinstance(status, bool):
+            return status
+    return None
+
+
+def is_retryable(error):
+    """
+    Quota, overload and transient errors: timeouts, connection errors,
+    google.api_core 429/5xx exceptions, any error with an HTTP status of
+    429 or 5xx, or a transient marker in the error's type or message.
+    Causes are checked as well, since LangChain wraps provider errors.
+    """
+    seen = set()
+
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, _retryable_types()):
+            return True
+
+        status = _status(error)
+        if status is not None:
+            return status == 429 or status >= 500
+
+        text = f"{type(error).__name__} {error}".lower()
+        if any(marker in text for marker in _RETRYABLE_MARKERS):
+            return True
+        error = error.__cause__ or error.__context__
+
+    return False
+
+
+def _usage(result):
+    # Token usage of an AIMessage, or of the raw message of structured output
+    message = result.get("raw") if isinstance(result, dict) else result
+    usage = getattr(message, "usage_metadata", None) or {}
+    return usage.get("input_tokens") or 0, usage.get("output_tokens") or 0
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 1)
+
+
+class LLMProvider:
+    """
+    Gate in front of the chat model. Every call
+
+      - waits for one of `max_concurrency` slots; when `max_queue` calls
+        are already waiting it fails fast with LLMOverloaded instead,
+      - is charged against a requests-per-minute and a tokens-per-minute
+        bucket (estimated input tokens up front, output tokens once known),
+      - is retried with jittered backoff on retryable errors and timeouts,
+      - records latency, queue wait and token usage for /metrics.
+
+    Callers keep building LangChain chains and run them through
+    ainvoke(chain, inputs) / astream(chain, inputs).
+    """
+
+    def __init__(
+        self,
+        model,
+        max_concurrency,
+        requests_per_minute,
+        tokens_per_minute,
+        max_queue,
+        max_retries,
+        timeout,
+    ):
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.timeout = timeout
+
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._requests = per_minute(requests_per_minute)
+        self._tokens = per_minute(tokens_per_minute)
+
+        self._waiting = 0
+        self._in_flight = 0
+        self._latencies = deque(maxlen=500)
+        self._waits = deque(maxlen=500)
+        self._counters = {
+            "calls": 0,
+            "errors": 0,
+            "retries": 0,
+            "rejected": 0,
+            "input_tokens": 0,
+            "output_tokens": 0,
+        }
+
+    # -----------------------------
+    # ADMISSION
+    # -----------------------------
+    def retry_after(self):
+        # Seconds until the queue ahead of a new caller should have drained
+        latency_s = (sum(self._latencies) / len(self._latencies) / 1000) if self._latencies else 5.0
+        return max(1, math.ceil(latency_s * (self._waiting + 1) / self.max_concurrency))
+
+    def overloaded(self):
+        return self._waiting >= self.max_queue
+
+    async def _admit(self, inputs):
+        if self.overloaded():
+            self._counters["rejected"] += 1
+            raise LLMOverloaded(self.retry_after())
+
+        start = time.perf_counter()
+        self._waiting += 1
+        try:
+            await self._slots.acquire()
+            try:
+                await self._requests.acquire()
+                await self._tokens.acquire(max(1, len(str(inputs)) // CHARS_PER_TOKEN))
+            except BaseException:
+                self._slots.release()
+                raise
+        finally:
+            self._waiting -= 1
+
+        self._in_flight += 1
+        self._waits.append((time.perf_counter() - start) * 1000)
+
+    def _release(self):
+        self._in_flight -= 1
+        self._slots.release()
+
+    def _record(self, start, result=None, input_tokens=0, output_tokens=0):
+        if result is not None:
+            input_tokens, output_tokens = _usage(result)
+        self._counters["calls"] += 1
+        self._counters["input_tokens"] += input_tokens
+        self._counters["output_tokens"] += output_tokens
+        self._latencies.append((time.perf_counter() - start) * 1000)
+        # Output tokens were unknown at admission: charge them now
+        self._tokens.debit(output_tokens)
+
+    async def _backoff(self, attempt, error):
+        self._counters["retries"] += 1
+        delay = backoff_delay(attempt)
+        print(f"LLM call failed ({error!r}); retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+    # -----------------------------
+    # CALLS
+    # -----------------------------
+    async def ainvoke(self, chain, inputs):
+        for attempt in range(self.max_retries + 1):
+            await self._admit(inputs)
+            start = time.perf_counter()
+            try:
+                result = await asyncio.wait_for(chain.ainvoke(inputs), self.timeout)
+            except Exception as e:
+                self._counters["errors"] += 1
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                error = e
+            else:
+                self._record(start, result)
+                return result
+            finally:
+                self._release()
+
+            await self._backoff(attempt, error)
+
+    async def astream(self, chain, inputs):
+        """
+        Stream chunks of `chain`. Errors before the first chunk are
+        retried; once output has been passed on, a failure is raised to
+        the caller (which knows what it already received).
+        """
+        for attempt in range(self.max_retries + 1):
+            await self._admit(inputs)
+            start = time.perf_counter()
+            input_tokens = output_tokens = 0
+            started = False
+            deadline = time.monotonic() + self.timeout
+            chunks = chain.astream(inputs)
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(
+                            chunks.__anext__(), max(0.0, deadline - time.monotonic())
+                        )
+                    except StopAsyncIteration:
+                        break
+                    started = True
+                    usage = getattr(chunk, "usage_metadata", None) or {}
+                    input_tokens += usage.get("input_tokens") or 0
+                    output_tokens += usage.get("output_tokens") or 0
+                    yield chunk
+            except Exception as e:
+                self._counters["errors"] += 1
+                if started or attempt == self.max_retries or not is_retryable(e):
+                    raise
+                error = e
+            else:
+                self._record(start, input_tokens=input_tokens, output_tokens=output_tokens)
+                return
+            finally:
+                self._release()
+                await chunks.aclose()
+
+            await self._backoff(attempt, error)
+
+    # -----------------------------
+    # METRICS
+    # -----------------------------
+    def stats(self):
+        latencies = list(self._latencies)
+        waits = list(self._waits)
+        return dict(
+            self._counters,
+            in_flight=self._in_flight,
+            waiting=self._waiting,
+            max_concurrency=self.max_concurrency,
+            max_queue=self.max_queue,
+            latency_p50_ms=_percentile(latencies, 0.5),
+            latency_p95_ms=_percentile(latencies, 0.95),
+            wait_p95_ms=_percentile(waits, 0.95),
+        )
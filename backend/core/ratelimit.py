@@ -0,0 +1,57 @@
+import asyncio
+import random
+import time
+
+
+class TokenBucket:
+    """
+    Async token bucket: refills `rate` tokens per second up to `capacity`.
+    acquire() waits until enough tokens are available, so callers are
+    smoothed to the configured rate instead of bursting into 429s.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity,
+            self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    async def acquire(self, amount=1):
+        # A request larger than the bucket could never be satisfied
+        amount = min(amount, self.capacity)
+
+        # The lock keeps waiters first-come first-served
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                await asyncio.sleep((amount - self._tokens) / self.rate)
+
+    def debit(self, amount):
+        """
+        Charge `amount` without waiting — for usage only known after the
+        fact. The bucket may go negative; later acquire() calls wait it off.
+        """
+        self._refill()
+        self._tokens -= amount
+
+
+def per_minute(limit):
+    """TokenBucket allowing `limit` units per minute with a one-minute burst."""
+    return TokenBucket(rate=limit / 60.0, capacity=limit)
+
+
+def backoff_delay(attempt, base=1.0, cap=30.0):
+    """Exponential backoff with full jitter for retry number `attempt` (0-based)."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
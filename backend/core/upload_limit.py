@@ -0,0 +1,63 @@
+from starlette.responses import JSONResponse
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+class UploadLimitMiddleware:
+    """
+    Caps request bodies at `max_bytes` before Starlette spools them to
+    disk. A Content-Length over the cap is rejected with 413 before any
+    of the body is read; a body without one (chunked) is counted as it
+    arrives and reading stops at the cap. Either way the oversized body
+    is never fully received or written to a temp file.
+    """
+
+    def __init__(self, app, max_bytes):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    def _too_large(self):
+        return JSONResponse(
+            status_code=413,
+            content={"error": f"File exceeds the {self.max_bytes // (1024 * 1024)} MB upload limit."}
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        length = dict(scope["headers"]).get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > self.max_bytes:
+            return await self._too_large()(scope, receive, send)
+
+        received = 0
+        exceeded = False
+        started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    exceeded = True
+                    raise _BodyTooLarge()
+            return message
+
+        async def guarded_send(message):
+            nonlocal started
+            # Whatever error the app makes of the aborted body is replaced
+            if exceeded:
+                return
+            started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except _BodyTooLarge:
+            pass
+
+        if exceeded and not started:
+            await self._too_large()(scope, receive, send)
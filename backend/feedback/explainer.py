@@ -1,8 +1,8 @@
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
-from core.llm import llm
-from rag.retriever import retrieve_random_context
+from core.llm import llm, llm_provider
+from rag.retriever import aretrieve_context
 
 
 # ==========================================
@@ -14,11 +14,12 @@ async def generate_explanation(
     correct_answer,
     user_answer,
     difficulty,
-    is_correct
+    is_correct,
+    document_ids=None
 ):
 
     # ✅ retrieve document context
-    context = retrieve_random_context()
+    context, _ = await aretrieve_context(document_ids=document_ids)
 
     prompt = ChatPromptTemplate.from_template("""
 You are an expert teacher.
@@ -54,7 +55,7 @@ Return ONLY explanation text.
 
     chain = prompt | llm | StrOutputParser()
 
-    explanation = await chain.ainvoke({
+    explanation = await llm_provider.ainvoke(chain, {
         "question": question,
         "correct": correct_answer,
         "user": user_answer,
@@ -1,13 +1,46 @@
-from fastapi import FastAPI, UploadFile, File
-from fastapi.responses import JSONResponse
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from typing import Literal
+
+from fastapi import FastAPI, Request, UploadFile, File, Form
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from core.cache import get_quiz, store_quiz
+from core.cache import get_quiz, new_quiz_id, store_quiz
+from core.config import DEFAULT_PARSE_MODE, MAX_UPLOAD_BYTES, UPLOAD_FORM_OVERHEAD
+from core.jobs import create_job, get_job, run_in_background, shutdown_executor
+from core.llm import embeddings, llm_provider
+from core.provider import LLMOverloaded
+from core.upload_limit import UploadLimitMiddleware
 from quiz.semantic import is_semantically_correct
-from rag.parser import parse_pdf
-from quiz.generator import generate_quiz
+from rag.parser import UploadTooLarge, parse_pdf, save_upload
+from rag.vector_store import (
+    cache_stats,
+    get_document,
+    latest_document_id,
+    list_documents,
+    list_sections,
+)
+from quiz.bank import bank_stats, prefill, quiz_from_bank, refill_worker
+from quiz.generator import NoContext, NoQuestionsGenerated, generate_quiz, stream_quiz
 from models.schemas import QuizRequest, SubmitRequest
 
-app = FastAPI(title="RAG Quiz Agent")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    bank_worker = run_in_background(refill_worker())
+    yield
+    bank_worker.cancel()
+    shutdown_executor()
+
+
+app = FastAPI(title="RAG Quiz Agent", lifespan=lifespan)
+
+# Oversized uploads are refused before Starlette spools them to disk
+app.add_middleware(
+    UploadLimitMiddleware,
+    max_bytes=MAX_UPLOAD_BYTES + UPLOAD_FORM_OVERHEAD,
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -17,6 +50,38 @@ app.add_middleware(
 )
 
 
+def overloaded_response(retry_after):
+    return JSONResponse(
+        status_code=503,
+        content={"error": "The quiz generator is busy. Please try again shortly."},
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
+@app.exception_handler(LLMOverloaded)
+async def llm_overloaded(request: Request, exc: LLMOverloaded):
+    # The LLM wait queue is full: fail fast so clients back off
+    return overloaded_response(exc.retry_after)
+
+
+@app.exception_handler(NoQuestionsGenerated)
+async def no_questions_generated(request: Request, exc: NoQuestionsGenerated):
+    # The model answered, but nothing in it was a usable question
+    return JSONResponse(
+        status_code=502,
+        content={"error": "No questions could be generated. Please try again."}
+    )
+
+
+@app.exception_handler(NoContext)
+async def no_context(request: Request, exc: NoContext):
+    # Retrieval found nothing to base questions on (e.g. empty sections)
+    return JSONResponse(
+        status_code=422,
+        content={"error": str(exc)}
+    )
+
+
 def resolve_full_answer(answer: str, options: list) -> str:
     """
     LLMs often return just a letter like "B" or "B)" as the answer.
@@ -61,31 +126,216 @@ def normalize_for_comparison(text: str, options: list = None) -> str:
     return text.lower()
 
 
+def client_question(q: dict) -> dict:
+    """
+    What the frontend may see of a question: text and options, never the
+    answer or explanation.
+    """
+    client_q = {"question": q["question"]}
+    if "options" in q:
+        client_q["options"] = q["options"]
+    return client_q
+
+
+def documents_missing(request: QuizRequest) -> bool:
+    unknown = [d for d in request.document_ids if get_document(d) is None]
+    return bool(unknown) or latest_document_id() is None
+
+
+async def unknown_sections(request: QuizRequest) -> list:
+    # Requested section names that none of the quiz's documents has
+    if not request.sections:
+        return []
+
+    known = set()
+    for document_id in request.document_ids or [latest_document_id()]:
+        sections = await asyncio.to_thread(list_sections, document_id)
+        known.update(section["section"] for section in sections or [])
+    return [section for section in request.sections if section not in known]
+
+
+def unknown_sections_response(unknown):
+    return JSONResponse(
+        status_code=422,
+        content={"error": f"Unknown sections: {', '.join(unknown)}"}
+    )
+
+
+async def parse_and_prefill(job_id, path, doc_hash, name, mode):
+    await parse_pdf(job_id, path, doc_hash, name, mode)
+
+    # Pre-generate the document's question pools once it is indexed
+    job = get_job(job_id)
+    if job is not None and job["status"] == "done":
+        prefill(doc_hash)
+
+
 @app.post("/parse-document")
-async def parse_document(file: UploadFile = File(...)):
-    await parse_pdf(file)
-    return {"status": "success"}
+async def parse_document(
+    file: UploadFile = File(...),
+    mode: Literal["auto", "fast", "full"] = Form(DEFAULT_PARSE_MODE),
+):
+    try:
+        path, doc_hash = await save_upload(file)
+    except UploadTooLarge as e:
+        return JSONResponse(
+            status_code=413,
+            content={"error": str(e)}
+        )
+
+    # Conversion + embedding run as a background job; poll /jobs/{job_id}
+    job_id = create_job()
+    run_in_background(
+        parse_and_prefill(
+            job_id, path, doc_hash, file.filename or "document.pdf", mode
+        )
+    )
+
+    return {"status": "queued", "job_id": job_id}
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = get_job(job_id)
+
+    if not job:
+        return JSONResponse(
+            status_code=404,
+            content={"error": "Job not found."}
+        )
+
+    return job
+
+
+@app.get("/documents")
+async def documents():
+    return {"documents": list_documents()}
+
+
+@app.get("/documents/{document_id}/sections")
+async def document_sections(document_id: str):
+    # Loads the index on a cache miss — keep it off the event loop
+    sections = await asyncio.to_thread(list_sections, document_id)
+
+    if sections is None:
+        return JSONResponse(
+            status_code=404,
+            content={"error": "Document not found."}
+        )
+
+    return {"document_id": document_id, "sections": sections}
 
 
 @app.post("/generate-quiz")
 async def generate(request: QuizRequest):
-    quiz = await generate_quiz(request)
+    if documents_missing(request):
+        return JSONResponse(
+            status_code=404,
+            content={"error": "Document not found. Please upload a PDF first."}
+        )
+
+    unknown = await unknown_sections(request)
+    if unknown:
+        return unknown_sections_response(unknown)
+
+    # Pre-generated questions when the bank has enough; live RAG + LLM otherwise
+    quiz = await quiz_from_bank(request)
+    if quiz is None:
+        if llm_provider.overloaded():
+            return overloaded_response(llm_provider.retry_after())
+        quiz = await generate_quiz(request)
+        quiz["stats"]["source"] = "live"
     quiz_id = store_quiz(quiz)
 
     # Send questions + options to frontend, but NOT answers/explanations
-    questions_for_client = []
-    for q in quiz["questions"]:
-        client_q = {"question": q["question"]}
-        if "options" in q:
-            client_q["options"] = q["options"]
-        questions_for_client.append(client_q)
+    questions_for_client = [client_question(q) for q in quiz["questions"]]
 
     return {
         "quiz_id": quiz_id,
-        "questions": questions_for_client
+        "questions": questions_for_client,
+        "stats": quiz.get("stats", {})
     }
 
 
+@app.post("/generate-quiz/stream")
+async def generate_stream(request: QuizRequest):
+    """
+    NDJSON stream: a "quiz" line with the quiz_id, one "question" line per
+    question as soon as the LLM has finished writing it, then "done" (or
+    "error"). The quiz is stored under the id once the stream completes.
+    """
+    if documents_missing(request):
+        return JSONResponse(
+            status_code=404,
+            content={"error": "Document not found. Please upload a PDF first."}
+        )
+
+    unknown = await unknown_sections(request)
+    if unknown:
+        return unknown_sections_response(unknown)
+
+    # Bank quizzes need no LLM; otherwise reject before the stream starts
+    # when the LLM queue is already full
+    banked = await quiz_from_bank(request)
+    if banked is None and llm_provider.overloaded():
+        return overloaded_response(llm_provider.retry_after())
+
+    quiz_id = new_quiz_id()
+
+    async def events():
+        yield json.dumps({"type": "quiz", "quiz_id": quiz_id}) + "\n"
+
+        if banked is not None:
+            store_quiz(banked, quiz_id)
+            for index, q in enumerate(banked["questions"]):
+                yield json.dumps({
+                    "type": "question",
+                    "index": index,
+                    "question": client_question(q),
+                }) + "\n"
+            yield json.dumps({
+                "type": "done",
+                "quiz_id": quiz_id,
+                "total": len(banked["questions"]),
+                "stats": banked["stats"],
+            }) + "\n"
+            return
+
+        index = 0
+        try:
+            async for event in stream_quiz(request):
+                if event["type"] == "question":
+                    yield json.dumps({
+                        "type": "question",
+                        "index": index,
+                        "question": client_question(event["question"]),
+                    }) + "\n"
+                    index += 1
+                else:
+                    quiz = event["quiz"]
+                    quiz["stats"]["source"] = "live"
+                    store_quiz(quiz, quiz_id)
+                    yield json.dumps({
+                        "type": "done",
+                        "quiz_id": quiz_id,
+                        "total": len(quiz["questions"]),
+                        "stats": quiz["stats"],
+                    }) + "\n"
+
+        except LLMOverloaded as e:
+            yield json.dumps({
+                "type": "error",
+                "error": str(e),
+                "retry_after": e.retry_after,
+            }) + "\n"
+
+        except Exception as e:
+            print(f"Quiz stream {quiz_id} failed: {e}")
+            yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
 @app.post("/submit-quiz")
 async def submit(request: SubmitRequest):
     quiz = get_quiz(request.quiz_id)
@@ -161,4 +411,14 @@ async def submit(request: SubmitRequest):
         "score": score,
         "total": len(results),
         "results": results
-    }
\ No newline at end of file
+    }
+
+
+@app.get("/metrics")
+async def metrics():
+    return {
+        "embedding_cache": embeddings.stats(),
+        "indexes": cache_stats(),
+        "question_bank": await asyncio.to_thread(bank_stats),
+        "llm": llm_provider.stats(),
+    }
@@ -1,12 +1,21 @@
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
 
 
 class QuizRequest(BaseModel):
-    topic: str
+    # Focus of the quiz; empty or "full document" = whole document
+    topic: str = ""
     num_questions: int
-    difficulty: str
-    question_type: str
+    # Checked here so an unknown value is a 422, not a new bank pool
+    difficulty: Literal["Easy", "Medium", "Hard"]
+    question_type: Literal["MCQ", "True/False", "Short Answer"]
+    # Library documents to quiz on; empty = the most recently parsed document
+    document_ids: List[str] = []
+    # Top-level section headings to draw from; empty = whole document
+    sections: List[str] = []
+    # Replayable quiz: the same seed (and document) gives the same quiz;
+    # None = a fresh quiz every time
+    seed: Optional[int] = None
 
 
 class AnswerItem(BaseModel):
@@ -16,4 +25,27 @@ class AnswerItem(BaseModel):
 
 class SubmitRequest(BaseModel):
     quiz_id: str
-    answers: List[AnswerItem]
\ No newline at end of file
+    answers: List[AnswerItem]
+
+
+# -----------------------------
+# LLM OUTPUT
+# -----------------------------
+class ShortAnswerQuestion(BaseModel):
+    question: str = Field(min_length=1)
+    answer: str = Field(min_length=1)
+    explanation: str = ""
+    concept: str = ""
+
+
+class ChoiceQuestion(ShortAnswerQuestion):
+    # MCQ ("A) ..." options, answer = full option text) and True/False
+    options: List[str] = Field(min_length=2)
+
+
+class ShortAnswerQuiz(BaseModel):
+    questions: List[ShortAnswerQuestion]
+
+
+class ChoiceQuiz(BaseModel):
+    questions: List[ChoiceQuestion]
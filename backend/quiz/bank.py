@@ -0,0 +1,284 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from core.config import (
+    BANK_LOW_WATERMARK,
+    BANK_PREFILL,
+    BANK_REFILL_BATCH,
+    BANK_TARGET_SIZE,
+    QUESTION_BANK_PATH,
+)
+from models.schemas import QuizRequest
+from quiz.dedup import question_key, remember_questions
+from quiz.generator import NoQuestionsGenerated, generate_quiz
+from rag.retriever import locate_chunk, normalize_topic
+from rag.vector_store import latest_document_id
+
+# Pools waiting for the refill worker: (document_id, difficulty, question_type)
+_refill_queue = None
+_pending = set()
+
+_conn = None
+_lock = threading.Lock()
+
+
+# -----------------------------
+# STORAGE
+# -----------------------------
+def _connect():
+    global _conn
+
+    if _conn is None:
+        directory = os.path.dirname(QUESTION_BANK_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = sqlite3.connect(QUESTION_BANK_PATH, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS questions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                document_id TEXT NOT NULL,
+                difficulty TEXT NOT NULL,
+                question_type TEXT NOT NULL,
+                question_key TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                concept TEXT,
+                source_chunk INTEGER,
+                section TEXT,
+                created_at REAL NOT NULL,
+                UNIQUE (document_id, difficulty, question_type, question_key)
+            )
+        """)
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_questions_pool "
+            "ON questions (document_id, difficulty, question_type)"
+        )
+        conn.commit()
+        _conn = conn
+
+    return _conn
+
+
+def pool_size(document_id, difficulty, question_type):
+    with _lock:
+        return _connect().execute(
+            "SELECT COUNT(*) FROM questions "
+            "WHERE document_id = ? AND difficulty = ? AND question_type = ?",
+            (document_id, difficulty, question_type),
+        ).fetchone()[0]
+
+
+def pool_questions(document_id, difficulty, question_type):
+    # Question texts stocked in a pool, for the refill's duplicate filter
+    with _lock:
+        rows = _connect().execute(
+            "SELECT payload FROM questions "
+            "WHERE document_id = ? AND difficulty = ? AND question_type = ?",
+            (document_id, difficulty, question_type),
+        ).fetchall()
+    return [json.loads(payload).get("question", "") for (payload,) in rows]
+
+
+def add_questions(document_id, difficulty, question_type, questions):
+    """
+    Store generated questions, tagged with concept and source chunk.
+    Duplicates of questions already in the pool are ignored.
+    Returns the number added.
+    """
+    rows = []
+    for question in questions:
+        key = question_key(question)
+        if not key:
+            continue
+
+        source = locate_chunk(
+            document_id, f"{question.get('question', '')} {question.get('answer', '')}"
+        ) or {}
+        rows.append((
+            document_id,
+            difficulty,
+            question_type,
+            key,
+            json.dumps(question),
+            question.get("concept", ""),
+            source.get("chunk_index"),
+            source.get("section"),
+            time.time(),
+        ))
+
+    with _lock:
+        conn = _connect()
+        cursor = conn.executemany(
+            "INSERT OR IGNORE INTO questions (document_id, difficulty, "
+            "question_type, question_key, payload, concept, source_chunk, "
+            "section, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        conn.commit()
+        return cursor.rowcount
+
+
+def take_questions(document_id, difficulty, question_type, count):
+    """
+    Remove `count` random questions from a pool. Returns (questions, pool
+    size left); questions is None if the pool holds fewer (nothing is
+    taken then). Questions are served once.
+    """
+    with _lock:
+        conn = _connect()
+        rows = conn.execute(
+            "SELECT id, payload FROM questions "
+            "WHERE document_id = ? AND difficulty = ? AND question_type = ? "
+            "ORDER BY RANDOM() LIMIT ?",
+            (document_id, difficulty, question_type, count),
+        ).fetchall()
+
+        if len(rows) == count:
+            conn.executemany(
+                "DELETE FROM questions WHERE id = ?", [(row[0],) for row in rows]
+            )
+            conn.commit()
+
+    remaining = pool_size(document_id, difficulty, question_type)
+
+    if len(rows) < count:
+        return None, remaining
+    return [json.loads(payload) for _, payload in rows], remaining
+
+
+async def quiz_from_bank(request):
+    """
+    A whole-document quiz for one document served straight from its pool,
+    or None when the request needs live generation (topic, sections,
+    several documents, a seed) or the pool is short. A pool left under
+    BANK_LOW_WATERMARK is queued for refill. Served questions are recorded
+    as asked, so the near-duplicate filter avoids them from then on.
+    """
+    if normalize_topic(request.topic) or request.sections or len(request.document_ids) > 1:
+        return None
+    # Seeded quizzes must be replayable; bank questions are served once
+    if request.seed is not None:
+        return None
+
+    document_id = request.document_ids[0] if request.document_ids else latest_document_id()
+    if document_id is None:
+        return None
+
+    start = time.perf_counter()
+    questions, remaining = await asyncio.to_thread(
+        take_questions,
+        document_id, request.difficulty, request.question_type, request.num_questions,
+    )
+    if remaining < BANK_LOW_WATERMARK:
+        queue_refill(document_id, request.difficulty, request.question_type)
+    if questions is None:
+        return None
+
+    await asyncio.to_thread(remember_questions, [document_id], questions)
+
+    return {
+        "questions": questions,
+        "stats": {
+            "source": "bank",
+            "bank_ms": round((time.perf_counter() - start) * 1000, 2),
+        },
+    }
+
+
+def bank_stats():
+    with _lock:
+        rows = _connect().execute(
+            "SELECT document_id, difficulty, question_type, COUNT(*) "
+            "FROM questions GROUP BY document_id, difficulty, question_type"
+        ).fetchall()
+
+    return {
+        "pools": [
+            {
+                "document_id": document_id,
+                "difficulty": difficulty,
+                "question_type": question_type,
+                "questions": count,
+            }
+            for document_id, difficulty, question_type, count in rows
+        ],
+        "pending_refills": len(_pending),
+    }
+
+
+# -----------------------------
+# BACKGROUND REFILL
+# -----------------------------
+def queue_refill(document_id, difficulty, question_type):
+    key = (document_id, difficulty, question_type)
+    if _refill_queue is None or key in _pending:
+        return
+
+    _pending.add(key)
+    _refill_queue.put_nowait(key)
+
+
+def prefill(document_id):
+    # Fill the configured pools of a freshly parsed document
+    for difficulty, question_type in BANK_PREFILL:
+        queue_refill(document_id, difficulty, question_type)
+
+
+async def _refill(document_id, difficulty, question_type):
+    while True:
+        missing = BANK_TARGET_SIZE - await asyncio.to_thread(
+            pool_size, document_id, difficulty, question_type
+        )
+        if missing <= 0:
+            return
+
+        # Filtered against the pool as well as the asked questions, so the
+        # batch adds no paraphrases of what is already stocked
+        pool = await asyncio.to_thread(
+            pool_questions, document_id, difficulty, question_type
+        )
+        try:
+            quiz = await generate_quiz(QuizRequest(
+                num_questions=min(BANK_REFILL_BATCH, missing),
+                difficulty=difficulty,
+                question_type=question_type,
+                document_ids=[document_id],
+            ), pool=pool)
+        except NoQuestionsGenerated:
+            quiz = {"questions": []}
+        added = await asyncio.to_thread(
+            add_questions, document_id, difficulty, question_type, quiz["questions"]
+        )
+        print(
+            f"Question bank: +{added} {difficulty} {question_type} "
+            f"for {document_id[:12]}"
+        )
+
+        if added == 0:
+            # Only near-duplicates came back — stop rather than spin on the LLM
+            return
+
+
+async def refill_worker():
+    """
+    Long-running task (started in the app lifespan) that fills queued
+    pools up to BANK_TARGET_SIZE, one pool at a time, so background work
+    never competes with live requests for more than one generation.
+    """
+    global _refill_queue
+
+    _refill_queue = asyncio.Queue()
+
+    while True:
+        key = await _refill_queue.get()
+        try:
+            await _refill(*key)
+        except Exception as e:
+            print(f"Question bank refill {key} failed: {e}")
+        finally:
+            _pending.discard(key)
@@ -0,0 +1,242 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from core.config import (
+    QUESTION_DEDUP_MODEL,
+    QUESTION_DEDUP_THRESHOLD,
+    QUESTION_INDEX_CACHE_SIZE,
+    QUESTION_INDEX_MAX,
+)
+from rag.doc_cache import atomic_open, document_dir
+
+QUESTION_INDEX_FILE = "questions.npz"
+
+# document_id → QuestionIndex, least recently used first
+_indexes = OrderedDict()
+_lock = threading.Lock()
+
+
+def _encode(texts):
+    # Imported lazily: loads torch + sentence-transformers
+    from core.local_embeddings import get_sentence_model
+
+    vectors = get_sentence_model(QUESTION_DEDUP_MODEL).encode(
+        texts,
+        normalize_embeddings=True,
+        convert_to_numpy=True,
+        show_progress_bar=False,
+    )
+    return np.asarray(vectors, dtype="float32")
+
+
+def question_key(question):
+    # Normalised question text: exact repeats compare equal
+    return " ".join(question.get("question", "").lower().split())
+
+
+# -----------------------------
+# PER-DOCUMENT INDEX
+# -----------------------------
+class QuestionIndex:
+    """
+    Questions already asked about one document: their texts and unit
+    embedding vectors, oldest first. Capped at QUESTION_INDEX_MAX — the
+    oldest questions are evicted first. Persisted next to the document's
+    conversions as questions.npz.
+    """
+
+    def __init__(self, document_id):
+        self.path = os.path.join(document_dir(document_id), QUESTION_INDEX_FILE)
+        self.texts = []
+        self.vectors = None
+
+        if os.path.exists(self.path):
+            data = np.load(self.path)
+            # Vectors from another model are not comparable: start over
+            if str(data["model"]) == QUESTION_DEDUP_MODEL:
+                self.texts = data["texts"].tolist()
+                self.vectors = data["vectors"]
+
+    def __len__(self):
+        return len(self.texts)
+
+    def add(self, texts, vectors):
+        if self.vectors is None:
+            self.vectors = vectors
+        else:
+            self.vectors = np.vstack([self.vectors, vectors])
+        self.texts.extend(texts)
+
+        if len(self.texts) > QUESTION_INDEX_MAX:
+            self.texts = self.texts[-QUESTION_INDEX_MAX:]
+            self.vectors = self.vectors[-QUESTION_INDEX_MAX:]
+
+    def save(self):
+        with atomic_open(self.path, "wb") as f:
+            np.savez(
+                f,
+                texts=np.array(self.texts, dtype=str),
+                vectors=self.vectors,
+                model=np.array(QUESTION_DEDUP_MODEL),
+            )
+
+
+def _get_index(document_id):
+    # Caller holds _lock
+    index = _indexes.get(document_id)
+    if index is None:
+        index = QuestionIndex(document_id)
+        _indexes[document_id] = index
+        if len(_indexes) > QUESTION_INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    else:
+        _indexes.move_to_end(document_id)
+    return index
+
+
+# -----------------------------
+# PER-QUIZ FILTER
+# -----------------------------
+class QuestionFilter:
+    """
+    Near-duplicate check for one quiz. A generated question is rejected
+    when its cosine similarity to any past question of the quiz's
+    documents, or to a question already accepted for this quiz, reaches
+    QUESTION_DEDUP_THRESHOLD. Each batch is checked with two matrix
+    products. Rejected questions are kept so fallback() can still fill a
+    quiz when a document has run out of fresh ones. remember() records
+    the questions finally served.
+
+    `pool` holds the question texts already stocked in a question-bank
+    pool: a refill batch is checked against them as well, and fallback()
+    offers nothing, so paraphrases never pile up in the pool.
+    """
+
+    def __init__(self, document_ids, pool=None):
+        self.document_ids = [document_id for document_id in document_ids if document_id]
+        self.rejected = 0
+        self.fallbacks = 0
+        self._allow_fallback = pool is None
+        self._accepted = {}   # question key → vector
+        self._candidates = []  # rejected: (similarity to past questions, question, vector)
+        self._lock = threading.Lock()
+
+        with _lock:
+            past = [
+                index.vectors
+                for index in map(_get_index, self.document_ids)
+                if index.vectors is not None
+            ]
+        if pool:
+            past.append(_encode(pool))
+        self.past_questions = sum(len(vectors) for vectors in past)
+        self._matrix = np.vstack(past) if past else None
+
+    def accept(self, questions):
+        """The questions of a batch that are not near-duplicates."""
+        if not questions:
+            return []
+
+        vectors = _encode([question.get("question", "") for question in questions])
+
+        with self._lock:
+            if self._matrix is not None:
+                past_max = (vectors @ self._matrix.T).max(axis=1)
+            else:
+                past_max = np.zeros(len(questions), dtype="float32")
+            within = vectors @ vectors.T
+
+            kept = []
+            for i in range(len(questions)):
+                duplicate = past_max[i] >= QUESTION_DEDUP_THRESHOLD or any(
+                    within[i, j] >= QUESTION_DEDUP_THRESHOLD for j in kept
+                )
+                if duplicate:
+                    self.rejected += 1
+                    self._candidates.append((float(past_max[i]), questions[i], vectors[i]))
+                else:
+                    kept.append(i)
+
+            self._add_accepted([questions[i] for i in kept], vectors[kept])
+
+        return [questions[i] for i in kept]
+
+    def _add_accepted(self, questions, vectors):
+        # Caller holds self._lock
+        if not questions:
+            return
+        self._matrix = vectors if self._matrix is None else np.vstack([self._matrix, vectors])
+        for question, vector in zip(questions, vectors):
+            self._accepted[question_key(question)] = vector
+
+    def fallback(self, count):
+        """
+        Up to `count` rejected questions, least similar to past questions
+        first, for a quiz that would otherwise come back short. Repeats
+        across quizzes are allowed; duplicates within this quiz are not.
+        """
+        if not self._allow_fallback:
+            return []
+
+        with self._lock:
+            self._candidates.sort(key=lambda candidate: candidate[0])
+            picked, vectors, remaining = [], [], []
+
+            for candidate in self._candidates:
+                _, question, vector = candidate
+                key = question_key(question)
+                duplicate = not key or key in self._accepted or any(
+                    float(vector @ other) >= QUESTION_DEDUP_THRESHOLD
+                    for other in list(self._accepted.values()) + vectors
+                )
+                if len(picked) < count and not duplicate:
+                    picked.append(question)
+                    vectors.append(vector)
+                elif not duplicate:
+                    remaining.append(candidate)
+
+            self._candidates = remaining
+            if picked:
+                self._add_accepted(picked, np.vstack(vectors))
+            self.fallbacks += len(picked)
+
+        return picked
+
+    def remember(self, questions):
+        # Record the questions served, reusing the vectors already computed
+        vectors = [self._accepted.get(question_key(question)) for question in questions]
+        remember_questions(self.document_ids, questions, vectors)
+
+    def stats(self):
+        return {
+            "past_questions": self.past_questions,
+            "rejected": self.rejected,
+            "fallbacks": self.fallbacks,
+        }
+
+
+def remember_questions(document_ids, questions, vectors=None):
+    """
+    Record questions served to a user in each document's index, so later
+    quizzes avoid them. `vectors` may hold known embeddings (None where
+    not known); the rest are encoded here.
+    """
+    document_ids = [document_id for document_id in document_ids if document_id]
+    if not document_ids or not questions:
+        return
+
+    texts = [question.get("question", "") for question in questions]
+    vectors = list(vectors) if vectors is not None else [None] * len(questions)
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    if missing:
+        for i, vector in zip(missing, _encode([texts[i] for i in missing])):
+            vectors[i] = vector
+
+    with _lock:
+        for document_id in document_ids:
+            index = _get_index(document_id)
+            index.add(texts, np.vstack(vectors))
+            index.save()
@@ -114,20 +114,26 @@
 
 #     return quiz
 
-import json
+import asyncio
+import math
 import random
 import re
 import datetime
+import time
 
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+from pydantic import ValidationError
 
-from core.llm import llm
-from rag.retriever import retrieve_random_context
-
-# Session-level memory: stores question strings already generated this run
-# so the LLM is explicitly told not to repeat them
-_generated_questions_history: list[str] = []
+from core.config import QUIZ_MAX_CONCURRENT_SHARDS, QUIZ_SHARD_RETRIES, QUIZ_SHARD_SIZE
+from core.llm import json_stream_llm, llm_provider, structured_llm
+from core.ratelimit import backoff_delay
+from models.schemas import ChoiceQuestion, ChoiceQuiz, ShortAnswerQuestion, ShortAnswerQuiz
+from rag.context_packer import chunks_for_budget, pack_context, token_budget
+from quiz.dedup import QuestionFilter, question_key
+from quiz.replay import get_replay, replay_key, save_replay
+from quiz.stream_parser import QuestionStreamParser, salvage_questions
+from rag.retriever import aretrieve_chunks, normalize_topic
+from rag.vector_store import latest_document_id
 
 
 # -----------------------------
@@ -177,42 +183,91 @@ def build_format(qtype):
 
 
 # -----------------------------
-# GENERATE QUIZ
+# LLM RESPONSE
 # -----------------------------
-async def generate_quiz(request):
-    global _generated_questions_history
-
-    # Fresh random context — different chunks every call
-    context = retrieve_random_context()
-
-    # Hard entropy: timestamp + random int so every call is unique
-    seed = random.randint(100000, 999999)
-    timestamp = datetime.datetime.now().strftime("%H:%M:%S.%f")
-    entropy_token = f"{seed}-{timestamp}"
-
-    # Build "avoid these questions" block from history
-    if _generated_questions_history:
-        avoid_block = (
-            "IMPORTANT — Do NOT generate any of these previously asked questions "
-            "or anything closely similar to them:\n"
-            + "\n".join(
-                f"- {q}" for q in _generated_questions_history[-30:]  # last 30
-            )
-        )
+def message_text(message):
+    # Gemini may return content as a list of parts
+    if isinstance(message.content, str):
+        return message.content
+    return "".join(
+        part.get("text", "") if isinstance(part, dict) else str(part)
+        for part in message.content
+    )
+
+
+class NoQuestionsGenerated(ValueError):
+    pass
+
+
+class NoContext(ValueError):
+    pass
+
+
+def quiz_schema(question_type):
+    return ShortAnswerQuiz if question_type == "Short Answer" else ChoiceQuiz
+
+
+def _validate_question(item, question_type):
+    # Schema-checked question dict, or None if the object is unusable
+    schema = ShortAnswerQuestion if question_type == "Short Answer" else ChoiceQuestion
+    try:
+        return schema.model_validate(item).model_dump()
+    except ValidationError:
+        return None
+
+
+def read_questions(result, question_type):
+    """
+    (raw message, valid question dicts, salvaged) from one LLM call.
+    `result` is structured output ({"raw", "parsed", ...}) or a plain
+    message. When the whole response does not parse, every complete
+    question object in it that passes the schema is kept.
+    """
+    if isinstance(result, dict):
+        message, parsed = result["raw"], result["parsed"]
     else:
-        avoid_block = ""
+        message, parsed = result, None
+        # Clean markdown fences if present
+        cleaned = re.sub(r"```json|```", "", message_text(message)).strip()
+        try:
+            parsed = quiz_schema(question_type).model_validate_json(cleaned)
+        except ValidationError:
+            pass
+
+    if parsed is not None:
+        return message, [question.model_dump() for question in parsed.questions], False
+
+    questions = [
+        question
+        for question in (
+            _validate_question(item, question_type)
+            for item in salvage_questions(message_text(message))
+        )
+        if question is not None
+    ]
+    print(f"Unparseable quiz response: salvaged {len(questions)} questions")
+    return message, questions, True
 
-    prompt = ChatPromptTemplate.from_template("""
+
+def _llm_stats(message, start):
+    usage = getattr(message, "usage_metadata", None) or {}
+    return {
+        "input_tokens": usage.get("input_tokens"),
+        "output_tokens": usage.get("output_tokens"),
+        "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+
+
+_QUIZ_PROMPT = ChatPromptTemplate.from_template("""
 Entropy token (use this to vary your output): {entropy_token}
 
-{avoid_block}
+{topic_block}
 
 Generate EXACTLY {num_questions} {difficulty} {question_type} questions
 STRICTLY based on the DOCUMENT CONTENT provided below.
 
 Rules:
 - Every question MUST come from a DIFFERENT part of the document.
-- DO NOT repeat or rephrase any previously asked question listed above.
 - DO NOT create meta questions about the document itself.
 - DO NOT refer to "the document" or "the text" in questions.
 - DO NOT hallucinate facts not present in the document.
@@ -228,34 +283,439 @@ DOCUMENT CONTENT:
 {context}
 """)
 
-    chain = prompt | llm | StrOutputParser()
 
-    raw = await chain.ainvoke({
-        "num_questions": request.num_questions,
+# -----------------------------
+# SHARDS
+# -----------------------------
+def shard_sizes(num_questions, shard_size=QUIZ_SHARD_SIZE):
+    # Balanced shards: 12 questions at size 5 → [4, 4, 4], not [5, 5, 2]
+    shards = max(1, math.ceil(num_questions / shard_size))
+    base, extra = divmod(num_questions, shards)
+    return [base + (1 if i < extra else 0) for i in range(shards)]
+
+
+def _split_chunks(chunks, shards):
+    # Round-robin over the priority-ordered chunks: disjoint slices that
+    # each get a fair share of the best-ranked context
+    return [chunks[i::shards] for i in range(shards)]
+
+
+def _merge_shards(results, num_questions):
+    seen = set()
+    questions = []
+    for shard_questions in results:
+        for question in shard_questions:
+            key = question_key(question)
+            if key and key not in seen:
+                seen.add(key)
+                questions.append(question)
+    return questions[:num_questions]
+
+
+def _prompt_inputs(request, num_questions, context, topic_block):
+    if request.seed is not None:
+        # Replayable quiz: the same seed always sends the same prompt
+        entropy_token = f"seed-{request.seed}"
+    else:
+        # Hard entropy: timestamp + random int so every call is unique
+        seed = random.randint(100000, 999999)
+        timestamp = datetime.datetime.now().strftime("%H:%M:%S.%f")
+        entropy_token = f"{seed}-{timestamp}"
+
+    return {
+        "num_questions": num_questions,
         "difficulty": request.difficulty,
         "question_type": request.question_type,
         "format": build_format(request.question_type),
         "context": context,
         "entropy_token": entropy_token,
-        "avoid_block": avoid_block,
-    })
+        "topic_block": topic_block,
+    }
+
+
+def _sum_calls(calls):
+    # One shard's stats across its initial call and any follow-ups
+    return {
+        "calls": len(calls),
+        "salvaged": sum(1 for call in calls if call["salvaged"]),
+        "input_tokens": sum(call["input_tokens"] or 0 for call in calls),
+        "output_tokens": sum(call["output_tokens"] or 0 for call in calls),
+        "latency_ms": round(sum(call["latency_ms"] for call in calls), 1),
+    }
+
+
+async def _generate_shard(request, num_questions, context, topic_block, question_filter):
+    """
+    LLM calls for `num_questions` questions over one context slice.
+    Output is constrained to the question schema; a response that still
+    fails to parse keeps every valid question in it. Near-duplicates are
+    dropped, and a short answer is topped up by a follow-up call asking
+    only for the missing count (up to QUIZ_SHARD_RETRIES follow-ups).
+    Still short after that, the least similar rejected questions fill in.
+    Transient provider errors are retried by the LLM provider.
+    """
+    chain = _QUIZ_PROMPT | structured_llm(quiz_schema(request.question_type))
+    questions = []
+    calls = []
+
+    for attempt in range(QUIZ_SHARD_RETRIES + 1):
+        start = time.perf_counter()
+        try:
+            result = await llm_provider.ainvoke(chain, _prompt_inputs(
+                request, num_questions - len(questions), context, topic_block
+            ))
+        except Exception as e:
+            # Already retried by the provider: keep what the shard has
+            if questions:
+                print(f"Quiz shard follow-up failed ({e}); keeping {len(questions)} questions")
+                break
+            raise
+
+        message, batch, salvaged = read_questions(result, request.question_type)
+        calls.append(dict(_llm_stats(message, start), salvaged=salvaged))
+        batch = await asyncio.to_thread(question_filter.accept, batch)
+        questions = _merge_shards([questions, batch], num_questions)
+
+        if len(questions) >= num_questions:
+            break
+        if attempt < QUIZ_SHARD_RETRIES:
+            print(
+                f"Quiz shard returned {len(questions)} of {num_questions} questions; "
+                f"requesting the rest"
+            )
+
+    if len(questions) < num_questions:
+        # Document running out of fresh questions: reuse the least-asked ones
+        questions += await asyncio.to_thread(
+            question_filter.fallback, num_questions - len(questions)
+        )
 
-    # Clean markdown fences if present
-    cleaned = re.sub(r"```json|```", "", raw).strip()
+    if not questions:
+        raise NoQuestionsGenerated("The model returned no usable questions.")
+    return questions, _sum_calls(calls)
+
+
+async def _stream_shard(request, num_questions, context, topic_block, question_filter, emit):
+    """
+    Streaming variant of _generate_shard: questions are parsed out of the
+    token stream, checked against the question schema and the duplicate
+    filter, and passed to `emit` as each one closes. A stream that ends
+    short or fails part-way is followed up with a call for only the
+    questions still missing, then filled from rejected near-duplicates.
+    """
+    chain = _QUIZ_PROMPT | json_stream_llm(quiz_schema(request.question_type))
+    emitted = 0
+    calls = []
+
+    for attempt in range(QUIZ_SHARD_RETRIES + 1):
+        start = time.perf_counter()
+        parser = QuestionStreamParser()
+        message = None
+        try:
+            async for chunk in llm_provider.astream(chain, _prompt_inputs(
+                request, num_questions - emitted, context, topic_block
+            )):
+                message = chunk if message is None else message + chunk
+                for item in parser.feed(message_text(chunk)):
+                    question = _validate_question(item, request.question_type)
+                    if question is None:
+                        continue
+                    if await asyncio.to_thread(question_filter.accept, [question]):
+                        emitted += 1
+                        await emit(question)
+            if message is not None:
+                calls.append(dict(_llm_stats(message, start), salvaged=False))
+
+        except Exception as e:
+            # Failures before any output were already retried by the provider
+            if not emitted:
+                raise
+            if attempt == QUIZ_SHARD_RETRIES or emitted >= num_questions:
+                break
+            delay = backoff_delay(attempt)
+            print(f"Quiz shard stream failed ({e}); retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            continue
+
+        if emitted >= num_questions:
+            break
+        if attempt < QUIZ_SHARD_RETRIES:
+            print(
+                f"Quiz shard streamed {emitted} of {num_questions} questions; "
+                f"requesting the rest"
+            )
 
-    quiz = json.loads(cleaned)
+    if emitted < num_questions:
+        for question in await asyncio.to_thread(
+            question_filter.fallback, num_questions - emitted
+        ):
+            emitted += 1
+            await emit(question)
 
-    # Shuffle questions
-    random.shuffle(quiz["questions"])
+    return _sum_calls(calls)
 
-    # Store generated questions in history to avoid future repeats
-    for q in quiz["questions"]:
-        question_text = q.get("question", "")
-        if question_text and question_text not in _generated_questions_history:
-            _generated_questions_history.append(question_text)
 
-    # Keep history bounded to 100 questions
-    if len(_generated_questions_history) > 100:
-        _generated_questions_history = _generated_questions_history[-100:]
+# -----------------------------
+# GENERATE QUIZ
+# -----------------------------
+async def _prepare(request, rng, pool=None):
+    """
+    Shard plan, per-shard packed context, topic block, duplicate filter
+    and replay key (seeded requests only) shared by the blocking and
+    streaming generators. `pool` is passed on to the QuestionFilter.
+    """
+    sizes = shard_sizes(request.num_questions)
+    budgets = [token_budget(size) for size in sizes]
+
+    # Fresh context — different chunks every call, packed per shard to a
+    # token budget that scales with the shard's question count
+    chunks, retrieval_timings = await aretrieve_chunks(
+        k=sum(chunks_for_budget(budget) for budget in budgets),
+        document_ids=request.document_ids,
+        sections=request.sections,
+        topic=request.topic,
+        rng=rng,
+    )
+
+    # Never prompt without document content — the model would invent a quiz
+    if not chunks:
+        raise NoContext("No document content matches this request.")
+
+    # Fewer chunks than shards: use fewer, larger shards so no shard is
+    # prompted with an empty context
+    if len(chunks) < len(sizes):
+        sizes = shard_sizes(
+            request.num_questions, math.ceil(request.num_questions / len(chunks))
+        )
+        budgets = [token_budget(size) for size in sizes]
+
+    packed = [
+        pack_context(shard_chunks, budget)
+        for shard_chunks, budget in zip(_split_chunks(chunks, len(sizes)), budgets)
+    ]
+
+    # Retrieval already focused the context; keep the questions on it too
+    topic = normalize_topic(request.topic)
+    topic_block = f"Focus every question on this topic: {topic}" if topic else ""
+
+    # Generated questions are checked against the documents' past questions
+    # instead of listing those in the prompt
+    document_ids = request.document_ids or [latest_document_id()]
+    question_filter = await asyncio.to_thread(QuestionFilter, document_ids, pool)
+
+    key = replay_key(request, document_ids, chunks) if rng is not None else None
+
+    return sizes, packed, topic_block, question_filter, retrieval_timings, key
+
+
+def _quiz_rng(request):
+    # Seeded requests draw every random choice from their own generator
+    return random.Random(request.seed) if request.seed is not None else None
+
+
+async def _load_replay(key, retrieval_timings):
+    quiz = await asyncio.to_thread(get_replay, key) if key is not None else None
+    if quiz is not None:
+        print(f"Quiz replayed from cache ({key[:12]})")
+        quiz["stats"] = dict(quiz["stats"], retrieval=retrieval_timings, replay="hit")
+    return quiz
+
+
+async def _save_replay(key, quiz):
+    if key is not None:
+        await asyncio.to_thread(save_replay, key, quiz)
+        quiz["stats"]["replay"] = "miss"
+
+
+def _sum_llm_stats(sizes, stats, failures, wall_ms):
+    return {
+        "shards": len(sizes),
+        "failed_shards": failures,
+        "calls": sum(s.get("calls", 0) for s in stats),
+        "salvaged_responses": sum(s.get("salvaged", 0) for s in stats),
+        "input_tokens": sum(s.get("input_tokens") or 0 for s in stats),
+        "output_tokens": sum(s.get("output_tokens") or 0 for s in stats),
+        "latency_ms": wall_ms,
+    }
+
+
+async def generate_quiz(request, pool=None):
+    """
+    Split the quiz into shards of up to QUIZ_SHARD_SIZE questions, each
+    generated from its own disjoint slice of the retrieved context, run
+    concurrently (at most QUIZ_MAX_CONCURRENT_SHARDS at once), then merged,
+    de-duplicated and trimmed to num_questions.
+
+    With request.seed, retrieval and the shuffle are seeded and the quiz
+    is cached: replaying the seed returns it without an LLM call.
+    A question-bank refill passes its pool's question texts as `pool`:
+    the batch is then also filtered against the pool, gets no fallback
+    questions, and is left out of the documents' asked-question indexes
+    (the bank records questions when they are served).
+    """
+    rng = _quiz_rng(request)
+    sizes, packed, topic_block, question_filter, retrieval_timings, key = (
+        await _prepare(request, rng, pool)
+    )
+
+    replayed = await _load_replay(key, retrieval_timings)
+    if replayed is not None:
+        return replayed
+
+    semaphore = asyncio.Semaphore(QUIZ_MAX_CONCURRENT_SHARDS)
+
+    async def run(size, context):
+        async with semaphore:
+            return await _generate_shard(
+                request, size, context, topic_block, question_filter
+            )
+
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(run(size, context) for size, (context, _) in zip(sizes, packed)),
+        return_exceptions=True,
+    )
+    wall_ms = round((time.perf_counter() - start) * 1000, 1)
+
+    failures = [r for r in results if isinstance(r, BaseException)]
+    results = [r for r in results if not isinstance(r, BaseException)]
+
+    if not results:
+        raise failures[0]
+    if failures:
+        # Shards already retried; a partial quiz beats failing the request
+        print(f"{len(failures)} of {len(sizes)} quiz shards failed: {failures[0]}")
+
+    quiz = {
+        "questions": _merge_shards(
+            [shard_questions for shard_questions, _ in results],
+            request.num_questions,
+        )
+    }
+
+    llm_stats = _sum_llm_stats(
+        sizes, [stats for _, stats in results], len(failures), wall_ms
+    )
+    print(
+        f"Quiz generation: {len(sizes)} shards, "
+        f"{llm_stats['input_tokens']} input tokens, {wall_ms} ms"
+    )
+
+    # Shuffle questions
+    (rng or random).shuffle(quiz["questions"])
+
+    if pool is None:
+        await asyncio.to_thread(question_filter.remember, quiz["questions"])
+
+    quiz["stats"] = {
+        "retrieval": retrieval_timings,
+        "context": [context_stats for _, context_stats in packed],
+        "llm": llm_stats,
+        "duplicates": question_filter.stats(),
+    }
+
+    await _save_replay(key, quiz)
+
+    return quiz
+
+
+async def stream_quiz(request):
+    """
+    Streaming generate_quiz: an async generator of events
+
+        {"type": "question", "question": {...}}   as each question closes
+        {"type": "done", "quiz": {...}}           the full quiz + stats
+
+    Shards stream concurrently; questions are de-duplicated as they arrive
+    and generation stops once num_questions have been sent. Arrival order
+    is the quiz order, so question indexes stay stable for /submit-quiz.
+    A replayed seed sends its cached questions at once.
+    """
+    sizes, packed, topic_block, question_filter, retrieval_timings, key = (
+        await _prepare(request, _quiz_rng(request))
+    )
+
+    replayed = await _load_replay(key, retrieval_timings)
+    if replayed is not None:
+        for question in replayed["questions"]:
+            yield {"type": "question", "question": question}
+        yield {"type": "done", "quiz": replayed}
+        return
+
+    queue = asyncio.Queue()
+    finished = object()
+    semaphore = asyncio.Semaphore(QUIZ_MAX_CONCURRENT_SHARDS)
+
+    async def run(size, context):
+        async with semaphore:
+            return await _stream_shard(
+                request, size, context, topic_block, question_filter, queue.put
+            )
 
-    return quiz
\ No newline at end of file
+    tasks = [
+        asyncio.create_task(run(size, context))
+        for size, (context, _) in zip(sizes, packed)
+    ]
+
+    async def close_queue():
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await queue.put(finished)
+
+    start = time.perf_counter()
+    first_question_ms = None
+    closer = asyncio.create_task(close_queue())
+    seen = set()
+    questions = []
+
+    try:
+        while len(questions) < request.num_questions:
+            question = await queue.get()
+            if question is finished:
+                break
+
+            qkey = question_key(question)
+            if not qkey or qkey in seen:
+                continue
+            seen.add(qkey)
+            questions.append(question)
+
+            if first_question_ms is None:
+                first_question_ms = round((time.perf_counter() - start) * 1000, 1)
+            yield {"type": "question", "question": question}
+
+    finally:
+        # Enough questions (or the client went away): stop the other shards
+        for task in tasks:
+            task.cancel()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.gather(closer, return_exceptions=True)
+
+    # Cancelled shards are BaseException, not failures
+    failures = [r for r in results if isinstance(r, Exception)]
+    stats = [r for r in results if isinstance(r, dict)]
+
+    if not questions:
+        raise failures[0] if failures else NoQuestionsGenerated("No questions were generated.")
+
+    wall_ms = round((time.perf_counter() - start) * 1000, 1)
+    llm_stats = _sum_llm_stats(sizes, stats, len(failures), wall_ms)
+    llm_stats["first_question_ms"] = first_question_ms
+    print(
+        f"Quiz stream: first question after {first_question_ms} ms, "
+        f"{len(questions)} questions in {wall_ms} ms"
+    )
+
+    await asyncio.to_thread(question_filter.remember, questions)
+
+    quiz = {
+        "questions": questions,
+        "stats": {
+            "retrieval": retrieval_timings,
+            "context": [context_stats for _, context_stats in packed],
+            "llm": llm_stats,
+            "duplicates": question_filter.stats(),
+        },
+    }
+    await _save_replay(key, quiz)
+
+    yield {"type": "done", "quiz": quiz}
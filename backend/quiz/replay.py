@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from core.config import QUIZ_REPLAY_CACHE_MAX_ENTRIES, QUIZ_REPLAY_CACHE_PATH
+
+_conn = None
+_lock = threading.Lock()
+
+
+# -----------------------------
+# STORAGE
+# -----------------------------
+def _connect():
+    global _conn
+
+    if _conn is None:
+        directory = os.path.dirname(QUIZ_REPLAY_CACHE_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = sqlite3.connect(QUIZ_REPLAY_CACHE_PATH, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS quizzes (
+                replay_key TEXT PRIMARY KEY,
+                quiz TEXT NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_quizzes_last_used ON quizzes (last_used)"
+        )
+        conn.commit()
+        _conn = conn
+
+    return _conn
+
+
+def replay_key(request, document_ids, chunks):
+    """
+    Cache key of a seeded quiz: the documents, the chunks retrieval picked,
+    the request parameters and the seed. A rebuilt index or a change to
+    any parameter gives a new key.
+    """
+    payload = {
+        "documents": list(document_ids),
+        "chunks": [
+            [doc.metadata.get("document_id"), doc.metadata.get("chunk_index")]
+            for doc in chunks
+        ],
+        "topic": request.topic,
+        "sections": list(request.sections),
+        "num_questions": request.num_questions,
+        "difficulty": request.difficulty,
+        "question_type": request.question_type,
+        "seed": request.seed,
+    }
+    return hashlib.sha256(
+        json.dumps(payload, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+
+def get_replay(key):
+    # Cached quiz (questions + stats from the original generation), or None
+    with _lock:
+        conn = _connect()
+        row = conn.execute(
+            "SELECT quiz FROM quizzes WHERE replay_key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute(
+            "UPDATE quizzes SET last_used = ? WHERE replay_key = ?", (time.time(), key)
+        )
+        conn.commit()
+    return json.loads(row[0])
+
+
+def save_replay(key, quiz):
+    with _lock:
+        conn = _connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO quizzes (replay_key, quiz, last_used) VALUES (?, ?, ?)",
+            (key, json.dumps(quiz), time.time()),
+        )
+        conn.execute(
+            "DELETE FROM quizzes WHERE replay_key IN ("
+            "SELECT replay_key FROM quizzes ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (QUIZ_REPLAY_CACHE_MAX_ENTRIES,),
+        )
+        conn.commit()
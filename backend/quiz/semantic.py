@@ -1,10 +1,11 @@
 import re
-from sentence_transformers import SentenceTransformer
 from sklearn.metrics.pairwise import cosine_similarity
 
+from core.local_embeddings import get_sentence_model
 
-# ✅ Load once globally
-model = SentenceTransformer("all-MiniLM-L6-v2")
+
+# ✅ Load once globally (shared with the local embedding backend)
+model = get_sentence_model("all-MiniLM-L6-v2")
 
 
 def normalize(text: str) -> str:
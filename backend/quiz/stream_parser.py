@@ -0,0 +1,97 @@
+import json
+
+
+class QuestionStreamParser:
+    """
+    Incremental parser for the quiz JSON the LLM streams back:
+
+        {"questions": [ {...}, {...}, ... ]}
+
+    feed() takes the next piece of text and returns every question object
+    that closed within it, so each question can be sent on before the rest
+    of the response exists. Markdown fences and text around the JSON are
+    ignored; nothing is parsed twice.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0            # next unread character in _buffer
+        self._in_array = False   # inside the "questions" array
+        self._depth = 0          # brace depth inside the current object
+        self._start = None       # buffer offset of the current object
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, text):
+        self._buffer += text
+        questions = []
+
+        if not self._in_array:
+            key = self._buffer.find('"questions"', self._pos)
+            if key == -1:
+                return questions
+            bracket = self._buffer.find("[", key)
+            if bracket == -1:
+                return questions
+            self._in_array = True
+            self._pos = bracket + 1
+
+        buffer = self._buffer
+        i = self._pos
+
+        while i < len(buffer):
+            char = buffer[i]
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+
+            elif char == '"':
+                self._in_string = True
+
+            elif char == "{":
+                if self._depth == 0:
+                    self._start = i
+                self._depth += 1
+
+            elif char == "}" and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    question = self._decode(buffer[self._start:i + 1])
+                    if question is not None:
+                        questions.append(question)
+                    self._start = None
+
+            i += 1
+
+        self._pos = i
+
+        # Drop text already consumed so the buffer stays one object long
+        cut = self._start if self._start is not None else self._pos
+        self._buffer = self._buffer[cut:]
+        self._pos -= cut
+        if self._start is not None:
+            self._start = 0
+
+        return questions
+
+    @staticmethod
+    def _decode(text):
+        try:
+            question = json.loads(text)
+        except json.JSONDecodeError:
+            return None
+        return question if isinstance(question, dict) else None
+
+
+def salvage_questions(text):
+    """
+    Every complete question object in a whole response that failed to
+    parse — a stray character or a truncated tail only loses the
+    question it is in.
+    """
+    return QuestionStreamParser().feed(text)
@@ -0,0 +1,121 @@
+import heapq
+import json
+import math
+import os
+import re
+from collections import Counter
+from functools import lru_cache
+
+from core.config import BM25_B, BM25_CACHE_SIZE, BM25_K1
+from rag.doc_cache import write_json
+
+BM25_FILE = "bm25.json"
+
+_TOKEN = re.compile(r"\w+")
+
+_STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the
+this to was were which with what how why who when where does do
+""".split())
+
+
+# -----------------------------
+# TOKENIZER
+# -----------------------------
+def tokenize(text):
+    # Lowercased word tokens; possessive 's and stopwords dropped so
+    # "Ohm's law" and "ohm law" match the same postings
+    return [
+        token for token in _TOKEN.findall(text.lower())
+        if token not in _STOPWORDS and (len(token) > 1 or token.isdigit())
+    ]
+
+
+# -----------------------------
+# INDEX
+# -----------------------------
+class BM25Index:
+    """
+    Okapi BM25 over the chunks of one FAISS index. Chunk i here is vector
+    i there, so hits map through index_to_docstore_id. Stored as an
+    inverted index: term → ([chunk, ...], [term frequency, ...]).
+    """
+
+    def __init__(self, postings, doc_lengths):
+        self.postings = postings
+        self.doc_lengths = doc_lengths
+        self.avg_length = (sum(doc_lengths) / len(doc_lengths)) if doc_lengths else 0.0
+
+    @classmethod
+    def build(cls, texts):
+        postings = {}
+        doc_lengths = []
+
+        for position, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                chunks, tfs = postings.setdefault(term, ([], []))
+                chunks.append(position)
+                tfs.append(tf)
+
+        return cls(postings, doc_lengths)
+
+    def save(self, index_path):
+        write_json(
+            os.path.join(index_path, BM25_FILE),
+            {"postings": self.postings, "doc_lengths": self.doc_lengths},
+            separators=(",", ":"),
+        )
+
+    def _idf(self, term):
+        df = len(self.postings[term][0])
+        n = len(self.doc_lengths)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def search(self, query, k):
+        """
+        Top-k (chunk position, score) pairs for `query`, best first.
+        Only chunks sharing a term with the query are scored.
+        """
+        scores = {}
+
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            idf = self._idf(term)
+            chunks, tfs = self.postings[term]
+            for position, tf in zip(chunks, tfs):
+                norm = BM25_K1 * (
+                    1 - BM25_B + BM25_B * self.doc_lengths[position] / self.avg_length
+                )
+                scores[position] = (
+                    scores.get(position, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+                )
+
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+
+@lru_cache(maxsize=BM25_CACHE_SIZE)
+def _load(path, mtime):
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return BM25Index(data["postings"], data["doc_lengths"])
+
+
+def load_bm25(index_path):
+    """
+    BM25 index stored next to a FAISS index, or None if it has none.
+    Recently used indexes stay in memory; the mtime in the cache key
+    means a rebuilt file is picked up.
+    """
+    path = os.path.join(index_path, BM25_FILE)
+    if not os.path.exists(path):
+        return None
+    return _load(path, os.path.getmtime(path))
+
+
+def save_bm25(texts, index_path):
+    index = BM25Index.build(texts)
+    index.save(index_path)
+    return index
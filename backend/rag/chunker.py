@@ -0,0 +1,207 @@
+import re
+from collections import Counter
+
+from docling_core.transforms.chunker import HierarchicalChunker
+from docling_core.types.doc import DoclingDocument
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from core.config import CHUNK_SIZE, CHUNK_OVERLAP
+
+# Element types that are never merged with neighbouring prose
+_STANDALONE_TYPES = {"table", "code", "formula"}
+
+# Heading lines in text-layer pages: "2. Unified system", "1.3 Scope",
+# "Chapter 4 Results" — the numbering gives the depth. A bare number is not
+# enough ("12 Students were surveyed", table rows like "4 CARD32 OFFSET"):
+# a single number needs its dot, deeper numbering its dotted form
+_HEADING_LINE = re.compile(
+    r"^(?:\d{1,2}(?:\.\d{1,2})*\.\s+[A-Z]"
+    r"|\d{1,2}(?:\.\d{1,2})+\s+[A-Z]"
+    r"|(?i:chapter|section|part|appendix)\s+[\dIVXLC]+[.:]?\s+[A-Z])"
+    r"[^.;]*$"
+)
+_HEADING_NUMBER = re.compile(r"\d+(?:\.\d+)*")
+_HEADING_MAX_CHARS = 60
+
+
+def _splitter():
+    return RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP
+    )
+
+
+# -----------------------------
+# RECURSIVE (flat markdown) CHUNKING
+# -----------------------------
+def split_markdown(markdown):
+    return [
+        Document(
+            page_content=chunk,
+            metadata={"source": "document", "chunk_index": i}
+        )
+        for i, chunk in enumerate(_splitter().split_text(markdown))
+    ]
+
+
+# -----------------------------
+# STRUCTURE-AWARE CHUNKING
+# -----------------------------
+def _element_type(doc_items):
+    labels = [str(item.label.value) for item in doc_items]
+
+    for label in ("table", "code", "formula"):
+        if label in labels:
+            return label
+
+    return Counter(labels).most_common(1)[0][0] if labels else "text"
+
+
+def _docling_units(document, inherited_headings):
+    """
+    One unit per docling element group: text, heading path, pages, type.
+    A page-range segment that starts mid-section inherits the heading
+    path the previous segment ended with.
+    """
+    units = []
+    headings = inherited_headings
+
+    for chunk in HierarchicalChunker().chunk(document):
+        if chunk.meta.headings:
+            headings = list(chunk.meta.headings)
+
+        pages = sorted({
+            prov.page_no
+            for item in chunk.meta.doc_items
+            for prov in item.prov
+        })
+
+        units.append({
+            "text": chunk.text,
+            "headings": headings,
+            "pages": pages,
+            "type": _element_type(chunk.meta.doc_items),
+        })
+
+    return units, headings
+
+
+def _heading_depth(line):
+    # Depth of a numbered / "Chapter N" heading line, or None for body text
+    if len(line) > _HEADING_MAX_CHARS:
+        return None
+    if _HEADING_LINE.match(line) is None:
+        return None
+    number = _HEADING_NUMBER.match(line)
+    return number.group().count(".") + 1 if number else 1
+
+
+def _text_units(segment, headings):
+    """
+    Fast-path pages carry no layout, so headings are recovered from
+    numbered heading lines: the page is split at each one and the heading
+    path updated by its depth. Text before the first heading of the
+    document stays outside any section, like docling text above its first
+    heading, so retrieval stratifies it by position.
+    """
+    page = segment["pages"][0]
+    units = []
+    lines = []
+
+    def flush():
+        if lines:
+            units.append({
+                "text": "\n".join(lines),
+                "headings": headings,
+                "pages": [page],
+                "type": "text",
+            })
+
+    for line in segment["markdown"].splitlines():
+        depth = _heading_depth(line.strip())
+        if depth is not None:
+            flush()
+            lines = []
+            headings = headings[:depth - 1] + [line.strip()]
+        lines.append(line)
+
+    flush()
+    return units, headings
+
+
+def _merge_units(units):
+    """
+    Pack consecutive prose units of the same section up to CHUNK_SIZE, so
+    chunks never straddle a heading and tables/code stay whole.
+    """
+    merged = []
+
+    for unit in units:
+        if not unit["text"].strip():
+            continue
+
+        previous = merged[-1] if merged else None
+        if (
+            previous is not None
+            and previous["headings"] == unit["headings"]
+            and previous["type"] not in _STANDALONE_TYPES
+            and unit["type"] not in _STANDALONE_TYPES
+            and len(previous["text"]) + len(unit["text"]) + 2 <= CHUNK_SIZE
+        ):
+            previous["text"] += "\n\n" + unit["text"]
+            previous["pages"] = sorted(set(previous["pages"]) | set(unit["pages"]))
+            continue
+
+        merged.append(dict(unit, pages=list(unit["pages"])))
+
+    return merged
+
+
+def split_structured(segments):
+    """
+    Chunk a conversion (list of page-ordered segments) along the
+    DoclingDocument hierarchy. Every chunk records its section, heading
+    path, page span, element type and position in the document, so
+    retrieval can filter or stratify without extra embedding calls.
+    """
+    units = []
+    headings = []
+
+    for segment in segments:
+        if segment["document"] is not None:
+            document = DoclingDocument.model_validate(segment["document"])
+            segment_units, headings = _docling_units(document, headings)
+            units += segment_units
+        else:
+            segment_units, headings = _text_units(segment, headings)
+            units += segment_units
+
+    splitter = _splitter()
+    docs = []
+
+    for unit in _merge_units(units):
+        # Oversized units (long sections, big tables) fall back to the
+        # character splitter but keep the unit's structural metadata
+        pieces = (
+            [unit["text"]] if len(unit["text"]) <= CHUNK_SIZE
+            else splitter.split_text(unit["text"])
+        )
+
+        for piece in pieces:
+            docs.append(
+                Document(
+                    page_content=piece,
+                    metadata={
+                        "source": "document",
+                        "chunk_index": len(docs),
+                        "section": unit["headings"][0] if unit["headings"] else "",
+                        "heading_path": " > ".join(unit["headings"]),
+                        "page_start": unit["pages"][0] if unit["pages"] else None,
+                        "page_end": unit["pages"][-1] if unit["pages"] else None,
+                        "element_type": unit["type"],
+                    },
+                )
+            )
+
+    return docs
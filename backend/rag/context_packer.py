@@ -0,0 +1,153 @@
+import math
+
+from core.config import (
+    CHARS_PER_TOKEN,
+    CHUNK_OVERLAP,
+    CHUNK_SIZE,
+    CONTEXT_BASE_TOKENS,
+    CONTEXT_MAX_TOKENS,
+    CONTEXT_TOKENS_PER_QUESTION,
+)
+
+SEPARATOR = "\n\n---\n\n"
+
+# Overlaps shorter than this are treated as coincidence, not splitter overlap
+_MIN_OVERLAP = 20
+
+# Paragraphs shorter than this are never deduplicated (headings, bullets)
+_MIN_SPAN = 40
+
+
+# -----------------------------
+# BUDGET
+# -----------------------------
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def token_budget(num_questions):
+    return min(
+        CONTEXT_MAX_TOKENS,
+        CONTEXT_BASE_TOKENS + CONTEXT_TOKENS_PER_QUESTION * max(1, num_questions),
+    )
+
+
+def chunks_for_budget(budget_tokens):
+    """
+    Chunks to retrieve so that, after overlap is stripped, the budget can
+    be filled — plus a little slack for dropped duplicates.
+    """
+    return math.ceil(budget_tokens * CHARS_PER_TOKEN / CHUNK_SIZE) + 2
+
+
+# -----------------------------
+# MERGE + DEDUPE
+# -----------------------------
+def _overlap(left, right):
+    # Longest suffix of `left` that is a prefix of `right` (splitter overlap
+    # is at most CHUNK_OVERLAP, give or take a separator)
+    longest = min(len(left), len(right), CHUNK_OVERLAP * 2)
+    for size in range(longest, _MIN_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _merge_adjacent(docs):
+    """
+    Join chunks that are neighbours in the same document (consecutive
+    chunk_index) into runs, dropping the splitter overlap between them.
+    Returns runs as [text, position, priority] in document order;
+    priority is the best retrieval rank inside the run.
+    """
+    def position(doc):
+        return (
+            doc.metadata.get("document_id") or "",
+            doc.metadata.get("chunk_index", -1),
+        )
+
+    ranked = sorted(enumerate(docs), key=lambda item: (position(item[1]), item[0]))
+
+    runs = []
+    previous = None
+
+    for rank, doc in ranked:
+        text = doc.page_content.strip()
+        current = position(doc)
+
+        if runs and current[1] >= 0 and previous is not None:
+            if current == previous:
+                # Same chunk retrieved twice
+                continue
+            if current == (previous[0], previous[1] + 1):
+                size = _overlap(runs[-1][0], text)
+                runs[-1][0] += text[size:] if size else "\n\n" + text
+                runs[-1][2] = min(runs[-1][2], rank)
+                previous = current
+                continue
+
+        runs.append([text, current, rank])
+        previous = current
+
+    return runs
+
+
+def _drop_repeated_spans(text, seen):
+    # Paragraph-level dedupe across runs: repeated headers/footers and
+    # overlap between chunks that were not retrieved next to each other
+    kept = []
+    for paragraph in text.split("\n"):
+        key = " ".join(paragraph.split()).lower()
+        if len(key) >= _MIN_SPAN:
+            if key in seen:
+                continue
+            seen.add(key)
+        kept.append(paragraph)
+    return "\n".join(kept).strip()
+
+
+# -----------------------------
+# PACK
+# -----------------------------
+def pack_context(docs, budget_tokens):
+    """
+    Assemble retrieved chunks into prompt context: merge neighbouring
+    chunks, strip repeated spans, then fill `budget_tokens` in retrieval
+    priority order and emit the kept runs in document order.
+    Returns (context, stats).
+    """
+    chars_in = sum(len(doc.page_content) for doc in docs)
+    runs = _merge_adjacent(docs)
+
+    seen = set()
+    for run in sorted(runs, key=lambda r: r[2]):
+        run[0] = _drop_repeated_spans(run[0], seen)
+
+    budget_chars = budget_tokens * CHARS_PER_TOKEN
+    used = 0
+    kept = []
+
+    for run in sorted(runs, key=lambda r: r[2]):
+        if not run[0]:
+            continue
+        cost = len(run[0]) + len(SEPARATOR)
+        if used + cost > budget_chars:
+            if kept:
+                continue
+            # Never return nothing: trim a lone oversized run
+            run[0] = run[0][:budget_chars]
+            cost = len(run[0])
+        kept.append(run)
+        used += cost
+
+    kept.sort(key=lambda r: r[1])
+    context = SEPARATOR.join(run[0] for run in kept)
+
+    return context, {
+        "chunks": len(docs),
+        "blocks": len(kept),
+        "chars_in": chars_in,
+        "chars_out": len(context),
+        "budget_tokens": budget_tokens,
+        "estimated_tokens": estimate_tokens(context),
+    }
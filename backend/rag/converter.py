@@ -0,0 +1,148 @@
+import re
+
+import pypdfium2 as pdfium
+from docling.document_converter import DocumentConverter
+
+from core.config import (
+    CONVERT_PAGES_PER_RANGE,
+    FASTPATH_MIN_CHARS_PER_PAGE,
+    FASTPATH_MIN_CLEAN_RATIO,
+)
+
+# Built lazily so each worker process loads the docling models only once
+_converter = None
+
+
+def _get_converter():
+    global _converter
+
+    if _converter is None:
+        _converter = DocumentConverter()
+    return _converter
+
+
+# -----------------------------
+# PAGE RANGES
+# -----------------------------
+def count_pages(path):
+    pdf = pdfium.PdfDocument(path)
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+
+def page_ranges(num_pages, pages_per_range=CONVERT_PAGES_PER_RANGE):
+    """
+    Split 1..num_pages into consecutive inclusive (start, end) ranges.
+    """
+    return [
+        (start, min(start + pages_per_range - 1, num_pages))
+        for start in range(1, num_pages + 1, pages_per_range)
+    ]
+
+
+def docling_ranges(pages, pages_per_range=CONVERT_PAGES_PER_RANGE, split=True):
+    """
+    Group sorted page numbers into contiguous (start, end) runs.
+    With split=True each run is further cut into pages_per_range pieces
+    so the pieces can convert in parallel.
+    """
+    runs = []
+
+    for page in pages:
+        if runs and page == runs[-1][1] + 1:
+            runs[-1][1] = page
+        else:
+            runs.append([page, page])
+
+    if not split:
+        return [tuple(run) for run in runs]
+
+    return [
+        (first, min(first + pages_per_range - 1, end))
+        for start, end in runs
+        for first in range(start, end + 1, pages_per_range)
+    ]
+
+
+# -----------------------------
+# TEXT LAYER (fast path)
+# -----------------------------
+def extract_text_layer(path):
+    """
+    Text of every page from the PDF's embedded text layer.
+    No layout or OCR models — milliseconds per page.
+    """
+    pdf = pdfium.PdfDocument(path)
+    texts = []
+
+    try:
+        for page in pdf:
+            textpage = page.get_textpage()
+            texts.append(textpage.get_text_range().replace("\r\n", "\n"))
+            textpage.close()
+            page.close()
+    finally:
+        pdf.close()
+
+    return texts
+
+
+def has_text_layer(text):
+    """
+    True when a page's text layer is good enough to skip docling.
+    Scanned pages have no text; broken font encodings produce
+    replacement characters, control codes or "(cid:NN)" noise.
+    """
+    stripped = re.sub(r"\s+", "", text)
+
+    if len(stripped) < FASTPATH_MIN_CHARS_PER_PAGE:
+        return False
+
+    noise = len(re.findall(r"\(cid:\d+\)", text)) * 8
+    noise += sum(
+        1 for ch in stripped
+        if ch == "\ufffd" or (not ch.isprintable())
+    )
+    alnum = sum(1 for ch in stripped if ch.isalnum())
+
+    clean_ratio = 1 - noise / len(stripped)
+    return (
+        clean_ratio >= FASTPATH_MIN_CLEAN_RATIO
+        and alnum / len(stripped) >= 0.5
+    )
+
+
+# -----------------------------
+# CONVERSION
+# (runs inside the ingestion process pool)
+# -----------------------------
+def _segment(document, start, end):
+    return {
+        "pages": [start, end],
+        "path": "docling",
+        "markdown": document.export_to_markdown(),
+        "document": document.export_to_dict(),
+    }
+
+
+def convert_pdf(path):
+    """Serial path: the whole PDF in one docling call."""
+    document = _get_converter().convert(path).document
+    return _segment(document, 1, len(document.pages))
+
+
+def text_segment(page, text):
+    return {
+        "pages": [page, page],
+        "path": "text",
+        "markdown": text.strip(),
+        "document": None,
+    }
+
+
+def convert_pages(path, start, end):
+    """One page range (1-based, inclusive) of the PDF."""
+    result = _get_converter().convert(path, page_range=(start, end))
+    return _segment(result.document, start, end)
@@ -0,0 +1,123 @@
+import json
+import os
+import re
+import tempfile
+from contextlib import contextmanager
+
+from core.config import (
+    DOCUMENT_CACHE_DIR,
+    EMBEDDING_MODEL,
+    INDEX_STRATEGY,
+    CHUNK_SIZE,
+    CHUNK_OVERLAP,
+    CHUNKING_STRATEGY,
+    CHUNKER_VERSION,
+)
+
+# Layout (one directory per SHA-256 of the uploaded bytes):
+#
+#   document_cache/<sha256>/
+#       conversion-<mode>.json          extracted pages + docling output
+#       conversion-<mode>.stats.json    which path (text layer / docling) each page took
+#       questions.npz                   embeddings of questions already asked (quiz/dedup.py)
+#       indexes/<mode>-<index_key>/     FAISS index for one mode/embedding/chunking setup
+#           query_pool.json             retriever query vectors for the index's model
+#           bm25.json                   BM25 inverted index over the same chunks
+#           usage.json                  per-chunk quiz usage counts (coverage sampler)
+#       checkpoints/<mode>-<index_key>/ embedded batches of an unfinished index build
+
+
+def document_dir(doc_hash):
+    return os.path.join(DOCUMENT_CACHE_DIR, doc_hash)
+
+
+def conversion_path(doc_hash, mode):
+    return os.path.join(document_dir(doc_hash), f"conversion-{mode}.json")
+
+
+def _stats_path(doc_hash, mode):
+    return os.path.join(document_dir(doc_hash), f"conversion-{mode}.stats.json")
+
+
+def has_conversion(doc_hash, mode):
+    return os.path.exists(conversion_path(doc_hash, mode))
+
+
+def load_conversion(doc_hash, mode):
+    path = conversion_path(doc_hash, mode)
+
+    if not os.path.exists(path):
+        return None
+
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_conversion_stats(doc_hash, mode):
+    path = _stats_path(doc_hash, mode)
+
+    if not os.path.exists(path):
+        return None
+
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+@contextmanager
+def atomic_open(path, mode="w"):
+    """
+    File object for writing `path` via a temp file renamed into place on
+    success, so a crash never leaves a half-written cache entry. Used for
+    every cache file under document_cache/.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    # Unique temp name: concurrent writers of one path never share it
+    fd, tmp_path = tempfile.mkstemp(
+        dir=directory or ".", prefix=f"{os.path.basename(path)}.", suffix=".tmp"
+    )
+    encoding = None if "b" in mode else "utf-8"
+    try:
+        with os.fdopen(fd, mode, encoding=encoding) as f:
+            yield f
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+
+
+def write_json(path, data, **kwargs):
+    with atomic_open(path) as f:
+        json.dump(data, f, **kwargs)
+
+
+def save_conversion(doc_hash, mode, conversion):
+    # Stats first: a conversion file on disk implies its stats exist
+    write_json(_stats_path(doc_hash, mode), conversion["stats"])
+    write_json(conversion_path(doc_hash, mode), conversion)
+
+
+def index_key(mode):
+    """
+    Everything that changes the vectors or the chunk boundaries.
+    A new key means re-chunk + re-embed from the cached conversion.
+    """
+    model = re.sub(r"[^A-Za-z0-9]+", "-", EMBEDDING_MODEL).strip("-")
+    return (
+        f"{mode}-{model}-{CHUNKING_STRATEGY}{CHUNKER_VERSION}"
+        f"-c{CHUNK_SIZE}-o{CHUNK_OVERLAP}-{INDEX_STRATEGY}"
+    )
+
+
+def index_path(doc_hash, mode):
+    return os.path.join(document_dir(doc_hash), "indexes", index_key(mode))
+
+
+def has_index(doc_hash, mode):
+    return os.path.exists(os.path.join(index_path(doc_hash, mode), "index.faiss"))
+
+
+def checkpoint_path(doc_hash, mode):
+    return os.path.join(document_dir(doc_hash), "checkpoints", index_key(mode))
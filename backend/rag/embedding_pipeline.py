@@ -0,0 +1,166 @@
+import asyncio
+import hashlib
+import os
+from array import array
+
+from core.config import (
+    EMBEDDING_PROVIDER,
+    EMBED_BATCH_SIZE,
+    EMBED_MAX_IN_FLIGHT,
+    EMBED_MAX_RETRIES,
+    EMBED_REQUESTS_PER_MINUTE,
+)
+from core.ratelimit import backoff_delay, per_minute
+from rag.doc_cache import atomic_open
+
+# Shared by every index build in this process, so concurrent uploads
+# together stay under the provider's request quota. Local models have none.
+_rate_limiter = (
+    per_minute(EMBED_REQUESTS_PER_MINUTE)
+    if EMBEDDING_PROVIDER == "google" else None
+)
+
+
+# -----------------------------
+# CHECKPOINTS
+# -----------------------------
+def _batch_hash(batch):
+    digest = hashlib.sha256()
+    for text in batch:
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+def _checkpoint_file(checkpoint_dir, index, batch):
+    # The content hash in the name means a changed batch is never reused
+    return os.path.join(
+        checkpoint_dir, f"batch-{index:05d}-{_batch_hash(batch)}.f32"
+    )
+
+
+def _load_checkpoint(path, size):
+    if not os.path.exists(path):
+        return None
+
+    flat = array("f")
+    with open(path, "rb") as f:
+        flat.frombytes(f.read())
+
+    if not flat or len(flat) % size:
+        return None
+
+    dim = len(flat) // size
+    return [flat[i * dim:(i + 1) * dim].tolist() for i in range(size)]
+
+
+def _save_checkpoint(path, vectors):
+    flat = array("f")
+    for vector in vectors:
+        flat.extend(vector)
+
+    with atomic_open(path, "wb") as f:
+        f.write(flat.tobytes())
+
+
+# -----------------------------
+# BATCHED EMBEDDING
+# -----------------------------
+async def embed_in_batches(
+    texts,
+    embed_batch,
+    batch_size=EMBED_BATCH_SIZE,
+    max_in_flight=EMBED_MAX_IN_FLIGHT,
+    max_retries=EMBED_MAX_RETRIES,
+    rate_limiter=None,
+    checkpoint_dir=None,
+    on_progress=None,
+):
+    """
+    Embed `texts` in fixed-size batches and return vectors in input order.
+
+    embed_batch   async callable: list[str] → list[vector]. Any provider
+                  works, e.g. `embeddings.aembed_documents` or a
+                  DeterministicFakeEmbedding for local runs.
+    max_in_flight batches awaiting the provider at the same time.
+    rate_limiter  TokenBucket charged one token per batch request
+                  (defaults to the process-wide EMBED_REQUESTS_PER_MINUTE
+                  bucket for remote providers, no limit for local ones).
+    checkpoint_dir finished batches are written here, so a build that
+                  fails partway resumes from the first missing batch.
+    on_progress   callable(done_texts, total_texts).
+    """
+    if rate_limiter is None:
+        rate_limiter = _rate_limiter
+
+    batches = [
+        texts[start:start + batch_size]
+        for start in range(0, len(texts), batch_size)
+    ]
+    results = [None] * len(batches)
+    done = 0
+
+    if checkpoint_dir:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        for i, batch in enumerate(batches):
+            results[i] = _load_checkpoint(
+                _checkpoint_file(checkpoint_dir, i, batch), len(batch)
+            )
+            if results[i] is not None:
+                done += len(batch)
+
+    if on_progress:
+        on_progress(done, len(texts))
+
+    semaphore = asyncio.Semaphore(max_in_flight)
+
+    async def run(i, batch):
+        nonlocal done
+
+        async with semaphore:
+            for attempt in range(max_retries + 1):
+                if rate_limiter is not None:
+                    await rate_limiter.acquire()
+                try:
+                    vectors = await embed_batch(batch)
+                    break
+                except Exception as e:
+                    if attempt == max_retries:
+                        raise
+                    delay = backoff_delay(attempt)
+                    print(
+                        f"Embedding batch {i} failed ({e}); "
+                        f"retrying in {delay:.1f}s"
+                    )
+                    await asyncio.sleep(delay)
+
+        if len(vectors) != len(batch):
+            raise ValueError(
+                f"Embedding batch {i} returned {len(vectors)} vectors "
+                f"for {len(batch)} texts"
+            )
+
+        if checkpoint_dir:
+            _save_checkpoint(_checkpoint_file(checkpoint_dir, i, batch), vectors)
+
+        results[i] = vectors
+        done += len(batch)
+        if on_progress:
+            on_progress(done, len(texts))
+
+    tasks = [
+        asyncio.create_task(run(i, batch))
+        for i, batch in enumerate(batches)
+        if results[i] is None
+    ]
+
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        # Finished batches are already checkpointed; stop the rest
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+    return [vector for batch_vectors in results for vector in batch_vectors]
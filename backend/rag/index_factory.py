@@ -0,0 +1,153 @@
+import math
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+from core.config import (
+    INDEX_STRATEGY,
+    INDEX_FLAT_MAX_VECTORS,
+    INDEX_HNSW_MAX_VECTORS,
+    INDEX_IVF_FLAT_MAX_VECTORS,
+    HNSW_M,
+    HNSW_EF_CONSTRUCTION,
+    HNSW_EF_SEARCH,
+    IVF_NPROBE,
+    IVF_TRAIN_SAMPLE_SIZE,
+    IVF_PQ_M,
+)
+
+STRATEGIES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+
+# FAISS k-means wants ~39 training points per centroid
+_MIN_POINTS_PER_CENTROID = 39
+
+
+# -----------------------------
+# STRATEGY SELECTION
+# -----------------------------
+def choose_strategy(num_vectors, strategy=INDEX_STRATEGY):
+    """
+    Resolve "auto" by corpus size: exact search while it is cheap, graph
+    search for mid-size corpora, inverted lists (then product quantisation
+    for memory) for very large ones.
+    """
+    if strategy != "auto":
+        if strategy not in STRATEGIES:
+            raise ValueError(
+                f"Unknown INDEX_STRATEGY {strategy!r} "
+                f"(expected 'auto' or one of {', '.join(STRATEGIES)})."
+            )
+        return strategy
+
+    if num_vectors <= INDEX_FLAT_MAX_VECTORS:
+        return "flat"
+    if num_vectors <= INDEX_HNSW_MAX_VECTORS:
+        return "hnsw"
+    if num_vectors <= INDEX_IVF_FLAT_MAX_VECTORS:
+        return "ivf_flat"
+    return "ivf_pq"
+
+
+def _nlist(num_vectors):
+    # ~4·sqrt(n) inverted lists, never more than the data can train
+    return max(1, min(
+        int(4 * math.sqrt(num_vectors)),
+        num_vectors // _MIN_POINTS_PER_CENTROID,
+    ))
+
+
+def _pq_m(dim):
+    # Sub-quantizer count must divide the dimension
+    return max(m for m in range(1, min(IVF_PQ_M, dim) + 1) if dim % m == 0)
+
+
+# -----------------------------
+# BUILD
+# -----------------------------
+def build_index(vectors, strategy=INDEX_STRATEGY):
+    """
+    Build an empty FAISS index for `vectors` (float32 matrix), trained on a
+    sample when the strategy is IVF. Returns (index, resolved strategy).
+    Vectors are not added here — the LangChain wrapper adds them so its
+    docstore ids line up.
+    """
+    num_vectors, dim = vectors.shape
+    strategy = choose_strategy(num_vectors, strategy)
+
+    if strategy in ("ivf_flat", "ivf_pq"):
+        nlist = _nlist(num_vectors)
+        min_train = nlist * _MIN_POINTS_PER_CENTROID
+        if strategy == "ivf_pq":
+            # 8-bit PQ codebooks need 256 centroids' worth of points too
+            min_train = max(min_train, 256 * _MIN_POINTS_PER_CENTROID)
+
+        if num_vectors < min_train:
+            print(
+                f"Only {num_vectors} vectors — too few to train {strategy}; "
+                f"using flat"
+            )
+            strategy = "flat"
+
+    if strategy == "flat":
+        index = faiss.IndexFlatL2(dim)
+
+    elif strategy == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, HNSW_M)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+
+    else:
+        quantizer = faiss.IndexFlatL2(dim)
+        if strategy == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, _pq_m(dim), 8)
+
+        # Train on a random sample — k-means cost grows with sample size
+        rng = np.random.default_rng(0)
+        sample_size = min(num_vectors, max(IVF_TRAIN_SAMPLE_SIZE, min_train))
+        sample = vectors[rng.choice(num_vectors, sample_size, replace=False)]
+        index.train(sample)
+
+    apply_search_params(index)
+    return index, strategy
+
+
+def apply_search_params(index):
+    """
+    Apply the configured search-time knobs (nprobe / efSearch). Called after
+    every build and every load, so tuning applies to existing indexes too.
+    IVF indexes also get a direct map: MMR topic search reconstructs the
+    candidate vectors, which IVF cannot do without one. Set before the
+    vectors are added, it is kept up to date and saved with the index.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(IVF_NPROBE, ivf.nlist)
+        if ivf.direct_map.type == faiss.DirectMap.NoMap:
+            ivf.make_direct_map()
+
+    if hasattr(index, "hnsw"):
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+
+    return index
+
+
+def build_db(texts, vectors, metadatas, embeddings, strategy=INDEX_STRATEGY):
+    """
+    LangChain FAISS store over a strategy-selected index.
+    Returns (db, resolved strategy).
+    """
+    matrix = np.asarray(vectors, dtype=np.float32)
+    index, strategy = build_index(matrix, strategy)
+
+    db = FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=InMemoryDocstore(),
+        index_to_docstore_id={},
+    )
+    db.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas)
+
+    return db, strategy
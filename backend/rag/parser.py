@@ -1,51 +1,305 @@
+import asyncio
+import hashlib
+import shutil
 import tempfile
 import os
 
-from docling.document_converter import DocumentConverter
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_core.documents import Document
-
-from core.config import CHUNK_SIZE, CHUNK_OVERLAP
+from core.config import (
+    CHUNKING_STRATEGY,
+    UPLOAD_CHUNK_SIZE,
+    MAX_UPLOAD_BYTES,
+    CONVERT_PARALLEL_MIN_PAGES,
+    DEFAULT_PARSE_MODE,
+)
+from core.jobs import get_executor, update_job
 from core.llm import embeddings
-from rag.vector_store import save_db, set_db
+from rag import doc_cache
+from rag.chunker import split_markdown, split_structured
+from rag.converter import (
+    convert_pages,
+    count_pages,
+    docling_ranges,
+    extract_text_layer,
+    has_text_layer,
+    text_segment,
+)
+from rag.bm25 import save_bm25
+from rag.embedding_pipeline import embed_in_batches
+from rag.index_factory import build_db
+from rag.retriever import save_query_pool
+from rag.vector_store import get_document, load_index, register_document, save_db
+
+# (sha256, mode) → ingestion task in progress, so concurrent uploads of
+# the same bytes convert and embed them once
+_in_flight = {}
+
+
+# -----------------------------
+# WORKER-SIDE STEPS
+# (run inside the ingestion process pool)
+# -----------------------------
+def chunk_document(doc_hash, mode):
+    conversion = doc_cache.load_conversion(doc_hash, mode)
+
+    if CHUNKING_STRATEGY == "structure":
+        return split_structured(conversion["segments"])
+
+    markdown = "\n\n".join(
+        segment["markdown"] for segment in conversion["segments"]
+    )
+    return split_markdown(markdown)
+
+
+def embed_texts(texts):
+    return embeddings.embed_documents(texts)
+
+
+# -----------------------------
+# INGESTION
+# -----------------------------
+class UploadTooLarge(ValueError):
+    pass
+
+
+async def save_upload(file, max_bytes=MAX_UPLOAD_BYTES):
+    """
+    Stream the upload to a temp file in UPLOAD_CHUNK_SIZE pieces, so memory
+    use stays flat no matter how large the PDF is.
+    Returns (path, sha256 of the bytes) — the hash keys the document cache.
+    Raises UploadTooLarge as soon as max_bytes is exceeded; the partial
+    temp file is always removed on failure. Oversized request bodies are
+    already refused by UploadLimitMiddleware before Starlette spools them;
+    this check enforces the limit on the file part itself.
+    """
+    limit_message = f"File exceeds the {max_bytes // (1024 * 1024)} MB upload limit."
+
+    if file.size is not None and file.size > max_bytes:
+        raise UploadTooLarge(limit_message)
 
-from langchain_community.vectorstores import FAISS
+    digest = hashlib.sha256()
+    size = 0
 
-converter = DocumentConverter()
+    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
 
+    try:
+        with tmp:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(limit_message)
 
-async def parse_pdf(file):
+                digest.update(chunk)
+                tmp.write(chunk)
 
-    with tempfile.NamedTemporaryFile(
-        delete=False, suffix=".pdf"
-    ) as tmp:
+    except BaseException:
+        os.remove(tmp.name)
+        raise
 
-        tmp.write(await file.read())
-        path = tmp.name
+    return tmp.name, digest.hexdigest()
 
-    result = converter.convert(path)
-    markdown = result.document.export_to_markdown()
 
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=CHUNK_SIZE,
-        chunk_overlap=CHUNK_OVERLAP
+async def _convert(job_id, path, doc_hash, mode):
+    """
+    Convert the PDF and store the result in the document cache.
+
+    mode "auto" reads born-digital pages straight from the PDF text layer
+    and sends only scanned/garbled pages through docling; "fast" never runs
+    docling; "full" runs docling on every page. Docling pages are grouped
+    into page ranges that convert in parallel across the worker pool, and
+    all segments are kept in page order so the merged markdown reads like
+    a single serial conversion.
+    """
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+
+    update_job(job_id, stage="converting", progress=0.05)
+
+    if mode == "full":
+        num_pages = await loop.run_in_executor(executor, count_pages, path)
+        page_texts = None
+        docling_pages = list(range(1, num_pages + 1))
+    else:
+        page_texts = await loop.run_in_executor(
+            executor, extract_text_layer, path
+        )
+        num_pages = len(page_texts)
+        docling_pages = [] if mode == "fast" else [
+            page for page, text in enumerate(page_texts, start=1)
+            if not has_text_layer(text)
+        ]
+
+    text_pages = sorted(set(range(1, num_pages + 1)) - set(docling_pages))
+    segments = [
+        text_segment(page, page_texts[page - 1]) for page in text_pages
+    ]
+
+    # Few docling pages: one call per contiguous run; many: parallel ranges
+    ranges = docling_ranges(
+        docling_pages,
+        split=len(docling_pages) >= CONVERT_PARALLEL_MIN_PAGES,
     )
 
-    docs = []
+    pages_done = len(text_pages)
+    update_job(
+        job_id,
+        progress=round(0.05 + 0.35 * pages_done / max(num_pages, 1), 3)
+    )
 
-    for chunk in splitter.split_text(markdown):
-        docs.append(
-            Document(
-                page_content=chunk,
-                metadata={"source": "document"}
-            )
+    async def convert_range(start, end):
+        nonlocal pages_done
+
+        segment = await loop.run_in_executor(
+            executor, convert_pages, path, start, end
+        )
+        pages_done += end - start + 1
+        update_job(
+            job_id,
+            progress=round(0.05 + 0.35 * pages_done / max(num_pages, 1), 3)
         )
+        return segment
+
+    segments += await asyncio.gather(
+        *(convert_range(start, end) for start, end in ranges)
+    )
+    segments.sort(key=lambda segment: segment["pages"][0])
+
+    page_paths = ["text"] * num_pages
+    for page in docling_pages:
+        page_paths[page - 1] = "docling"
+
+    stats = {
+        "mode": mode,
+        "pages": num_pages,
+        "text_pages": len(text_pages),
+        "docling_pages": len(docling_pages),
+        "page_paths": page_paths,
+    }
+
+    await asyncio.to_thread(
+        doc_cache.save_conversion,
+        doc_hash,
+        mode,
+        {"stats": stats, "segments": segments},
+    )
+
+
+async def _build_index(job_id, doc_hash, mode):
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+
+    update_job(job_id, stage="chunking", progress=0.4)
+    docs = await loop.run_in_executor(executor, chunk_document, doc_hash, mode)
+
+    if not docs:
+        raise ValueError("No text could be extracted from the document.")
+
+    texts = [doc.page_content for doc in docs]
+
+    def on_progress(done, total):
+        update_job(job_id, progress=round(0.45 + 0.45 * done / total, 3))
+
+    update_job(job_id, stage="embedding", progress=0.45)
+    checkpoint_dir = doc_cache.checkpoint_path(doc_hash, mode)
+    vectors = await embed_in_batches(
+        texts,
+        lambda batch: loop.run_in_executor(executor, embed_texts, batch),
+        checkpoint_dir=checkpoint_dir,
+        on_progress=on_progress,
+    )
+
+    update_job(job_id, stage="indexing", progress=0.9)
+    db, strategy = await asyncio.to_thread(
+        build_db,
+        texts,
+        vectors,
+        [dict(doc.metadata, document_id=doc_hash) for doc in docs],
+        embeddings,
+    )
+    print(f"Built {strategy} index with {len(texts)} vectors")
+    index_path = doc_cache.index_path(doc_hash, mode)
+    await asyncio.to_thread(save_db, db, index_path)
+    await asyncio.to_thread(save_bm25, texts, index_path)
+    await asyncio.to_thread(save_query_pool, index_path)
+
+    # The index is durable now — batch checkpoints are no longer needed
+    shutil.rmtree(checkpoint_dir, ignore_errors=True)
+
+    return db
+
+
+async def _ingest(job_id, path, doc_hash, name, mode):
+    index_path = doc_cache.index_path(doc_hash, mode)
+    entry = get_document(doc_hash)
+    db = None
+
+    if doc_cache.has_index(doc_hash, mode):
+        cache = "index"
+        if entry and entry["index_path"] == index_path:
+            # Already registered — it loads lazily on the next quiz
+            chunks = entry["chunks"]
+        else:
+            update_job(job_id, stage="loading", progress=0.5)
+            db = await asyncio.to_thread(load_index, index_path)
+            chunks = db.index.ntotal
+
+    else:
+        if doc_cache.has_conversion(doc_hash, mode):
+            cache = "conversion"
+        else:
+            cache = "miss"
+            await _convert(job_id, path, doc_hash, mode)
+
+        db = await _build_index(job_id, doc_hash, mode)
+        chunks = db.index.ntotal
+
+    register_document(doc_hash, name, mode, index_path, chunks, db=db)
+
+    update_job(
+        job_id,
+        status="done",
+        stage="done",
+        progress=1.0,
+        result={
+            "document_id": doc_hash,
+            "chunks": chunks,
+            "cache": cache,
+            "conversion": doc_cache.load_conversion_stats(doc_hash, mode),
+        },
+    )
+
+
+async def parse_pdf(job_id, path, doc_hash, name, mode=DEFAULT_PARSE_MODE):
+    """
+    Background ingestion job: convert → chunk → embed → index → register.
+    Heavy steps are dispatched to the process pool so the event loop
+    stays free; progress is published through core.jobs.
+
+    Uploads are content-addressed: the SHA-256 is the document_id, a repeat
+    upload reuses the cached index, and a chunking/embedding config change
+    re-chunks the cached conversion instead of converting again. A repeat
+    upload arriving while the same bytes are still being ingested waits
+    for that job, then reuses its index.
+    """
+    key = (doc_hash, mode)
+
+    try:
+        update_job(job_id, status="running")
+
+        while key in _in_flight:
+            update_job(job_id, stage="waiting")
+            # Finished either way: done → cache hit below, failed → retry
+            await asyncio.wait({_in_flight[key]})
 
-    db = FAISS.from_documents(docs, embeddings)
+        task = asyncio.ensure_future(_ingest(job_id, path, doc_hash, name, mode))
+        _in_flight[key] = task
+        task.add_done_callback(lambda _: _in_flight.pop(key, None))
+        await task
 
-    set_db(db)
-    save_db(db)
+    except Exception as e:
+        print(f"Ingestion job {job_id} failed: {e}")
+        update_job(job_id, status="failed", stage="failed", error=str(e))
 
-    os.remove(path)
+    finally:
+        os.remove(path)
 
-    return True
\ No newline at end of file
+    return True
@@ -34,8 +34,32 @@
 
 #     return context
 
+import asyncio
+import json
+import math
+import os
 import random
-from rag.vector_store import get_db
+import threading
+import time
+from collections import OrderedDict
+
+import faiss
+import numpy as np
+
+from core.config import (
+    EMBEDDING_MODEL,
+    RETRIEVAL_STRATEGY,
+    RRF_K,
+    TOPIC_CACHE_SIZE,
+    TOPIC_FETCH_K,
+    TOPIC_MMR_LAMBDA,
+    TOPIC_SEARCH_MODE,
+)
+from core.llm import embeddings
+from rag.bm25 import load_bm25, save_bm25
+from rag.doc_cache import write_json
+from rag.sampler import get_sampler
+from rag.vector_store import get_db, get_document, latest_document_id
 
 
 # Pool of varied queries to hit different parts of the document each time
@@ -58,43 +82,401 @@ _QUERY_POOL = [
 ]
 
 
-def retrieve_random_context(k: int = 8) -> str:
+# Candidates fetched per query before a section filter is applied
+_FILTER_FETCH_K = 120
+
+QUERY_POOL_FILE = "query_pool.json"
+
+# EMBEDDING_MODEL → {query: vector}; the pool is the same for every index
+# built with one model, so a single resident copy serves all documents
+_pool_vectors = {}
+_pool_lock = threading.Lock()
+
+# Topics that mean "no particular topic"
+_WHOLE_DOCUMENT_TOPICS = {"", "full document", "whole document", "entire document", "all"}
+
+# Normalized topic → query vector, least-recently-used first
+_topic_vectors = OrderedDict()
+_topic_lock = threading.Lock()
+
+
+# -----------------------------
+# QUERY POOL VECTORS
+# -----------------------------
+def _read_query_pool(index_path):
+    path = os.path.join(index_path, QUERY_POOL_FILE)
+    if not os.path.exists(path):
+        return None
+
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+
+    vectors = data.get("vectors", {})
+    if data.get("model") != EMBEDDING_MODEL or set(vectors) != set(_QUERY_POOL):
+        return None
+    return vectors
+
+
+def save_query_pool(index_path):
     """
-    Retrieve truly random chunks from the vector DB by using
-    different random search queries each call, ensuring different
-    content is surfaced every time the quiz is generated.
+    Embed _QUERY_POOL once and persist it next to the index, so retrieval
+    searches by vector and makes no embedding calls. Called at index build;
+    indexes built before this file existed get it on their first quiz.
     """
-    db = get_db()
+    with _pool_lock:
+        vectors = _pool_vectors.get(EMBEDDING_MODEL)
+        if vectors is None:
+            vectors = {query: embeddings.embed_query(query) for query in _QUERY_POOL}
+            _pool_vectors[EMBEDDING_MODEL] = vectors
+
+    write_json(
+        os.path.join(index_path, QUERY_POOL_FILE),
+        {"model": EMBEDDING_MODEL, "vectors": vectors},
+    )
+
+    return vectors
+
+
+def query_pool_vectors(index_path):
+    vectors = _pool_vectors.get(EMBEDDING_MODEL)
+    if vectors is not None:
+        return vectors
+
+    vectors = _read_query_pool(index_path)
+    if vectors is None:
+        return save_query_pool(index_path)
+
+    _pool_vectors[EMBEDDING_MODEL] = vectors
+    return vectors
+
+
+# -----------------------------
+# TOPIC VECTORS
+# -----------------------------
+def normalize_topic(topic):
+    """
+    Case- and whitespace-insensitive topic key, or None for "no topic".
+    """
+    normalized = " ".join((topic or "").lower().split())
+    return None if normalized in _WHOLE_DOCUMENT_TOPICS else normalized
+
+
+def topic_vector(topic):
+    with _topic_lock:
+        if topic in _topic_vectors:
+            _topic_vectors.move_to_end(topic)
+            return _topic_vectors[topic]
+
+    vector = embeddings.embed_query(topic)
 
+    with _topic_lock:
+        _topic_vectors[topic] = vector
+        while len(_topic_vectors) > TOPIC_CACHE_SIZE:
+            _topic_vectors.popitem(last=False)
+
+    return vector
+
+
+def _section_filter(sections):
+    return {"section": {"$in": list(sections)}} if sections else None
+
+
+def _topic_search(sources, vector, k, sections=None, rng=random):
+    """
+    Max-marginal-relevance search per document: on-topic chunks that are
+    not near-duplicates of each other, split evenly across documents.
+    """
+    per_document = math.ceil(k / len(sources))
+    docs = []
+    for db, _ in sources:
+        docs += db.max_marginal_relevance_search_by_vector(
+            vector,
+            k=per_document,
+            fetch_k=max(TOPIC_FETCH_K, per_document),
+            lambda_mult=TOPIC_MMR_LAMBDA,
+            filter=_section_filter(sections),
+        )
+    return docs[:k] if len(sources) == 1 else rng.sample(docs, min(k, len(docs)))
+
+
+# -----------------------------
+# LEXICAL + HYBRID SEARCH
+# -----------------------------
+def _bm25_for(db, index_path):
+    bm25 = load_bm25(index_path)
+    if bm25 is None:
+        # Index built before BM25 existed — build it from the docstore once
+        texts = [
+            db.docstore.search(db.index_to_docstore_id[i]).page_content
+            for i in range(len(db.index_to_docstore_id))
+        ]
+        bm25 = save_bm25(texts, index_path)
+    return bm25
+
+
+def _lexical_ranking(db, index_path, topic, fetch_k, sections=None):
+    docs = []
+    for position, _ in _bm25_for(db, index_path).search(topic, fetch_k):
+        doc = db.docstore.search(db.index_to_docstore_id[position])
+        if sections and doc.metadata.get("section") not in sections:
+            continue
+        docs.append(doc)
+    return docs
+
+
+def _vector_ranking(db, vector, fetch_k, sections=None):
+    return [
+        doc for doc, _ in db.similarity_search_with_score_by_vector(
+            vector, k=fetch_k, filter=_section_filter(sections)
+        )
+    ]
+
+
+def locate_chunk(document_id, text):
+    """
+    Metadata of the chunk that best matches `text` lexically (e.g. a
+    generated question + answer), or None. Used to tag questions with
+    their source chunk without asking the model for it.
+    """
+    entry = get_document(document_id)
+    db = get_db(document_id) if entry else None
     if db is None:
+        return None
+
+    hits = _bm25_for(db, entry["index_path"]).search(text, 1)
+    if not hits:
+        return None
+
+    return db.docstore.search(db.index_to_docstore_id[hits[0][0]]).metadata
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """
+    Fuse ranked Document lists: score = Σ 1 / (k + rank). Documents are
+    matched by content, so the same chunk from both rankings adds up.
+    """
+    scores = {}
+    docs = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = doc.page_content
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            docs.setdefault(key, doc)
+
+    return [docs[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+def _ranked_search(sources, topic, vector, k, sections=None, rng=random):
+    """
+    Lexical (vector is None) or hybrid topic search, split evenly across
+    documents.
+    """
+    per_document = math.ceil(k / len(sources))
+    fetch_k = max(TOPIC_FETCH_K, per_document)
+    docs = []
+
+    for db, index_path in sources:
+        rankings = [_lexical_ranking(db, index_path, topic, fetch_k, sections)]
+        if vector is not None:
+            rankings.append(_vector_ranking(db, vector, fetch_k, sections))
+        docs += reciprocal_rank_fusion(rankings)[:per_document]
+
+    return docs[:k] if len(sources) == 1 else rng.sample(docs, min(k, len(docs)))
+
+
+# -----------------------------
+# RETRIEVAL
+# -----------------------------
+def _search_batch(db, matrix, k, sections=None):
+    """
+    One FAISS search for every query row of `matrix`. Returns a list of
+    up to k Documents per query; with `sections`, over-fetches and keeps
+    only chunks from those sections.
+    """
+    fetch_k = min(_FILTER_FETCH_K if sections else k, db.index.ntotal)
+    if fetch_k <= 0:
+        return [[] for _ in matrix]
+
+    if db._normalize_L2:
+        faiss.normalize_L2(matrix)
+
+    _, indices = db.index.search(matrix, fetch_k)
+
+    results = []
+    for row in indices:
+        docs = []
+        for i in row:
+            if i == -1:
+                continue
+            doc = db.docstore.search(db.index_to_docstore_id[i])
+            if sections and doc.metadata.get("section") not in sections:
+                continue
+            docs.append(doc)
+            if len(docs) == k:
+                break
+        results.append(docs)
+
+    return results
+
+
+def _elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+def _coverage_sample(sources, k, sections=None):
+    """
+    Least-used chunks from each document's CoverageSampler, split evenly
+    across documents. None when a section filter cannot be honoured
+    (documents stratified by position, or no stratum matches) — the caller
+    falls back to search, and an empty result from that is an error for
+    the quiz generator.
+    """
+    samplers = [
+        (db, get_sampler(index_path, db)) for db, index_path in sources
+    ]
+    if sections and not all(sampler.by_section for _, sampler in samplers):
+        return None
+
+    per_document = math.ceil(k / len(samplers))
+    docs = []
+    for db, sampler in samplers:
+        docs += [
+            db.docstore.search(docstore_id)
+            for docstore_id in sampler.sample(per_document, sections)
+        ]
+
+    if not docs:
+        return None
+    return random.sample(docs, min(k, len(docs)))
+
+
+def retrieve_chunks(k: int = 8, document_ids=None, sections=None, topic=None, rng=None):
+    """
+    Retrieve varied chunks for a quiz. A topic retrieves on-topic chunks
+    per TOPIC_SEARCH_MODE (MMR, BM25, or both fused). Without one, with RETRIEVAL_STRATEGY "coverage"
+    the least-used chunks are drawn stratified by section/position, so
+    repeated quizzes work through the whole document; otherwise random
+    queries from the pool are searched against the index.
+
+    document_ids selects which library documents to draw from
+    (default: the most recently parsed one). sections restricts
+    retrieval to chunks whose top-level heading is in the list.
+
+    rng (a seeded random.Random) makes retrieval replayable: every random
+    choice comes from it, and the coverage sampler is skipped because its
+    usage counts change with every quiz.
+
+    Returns (chunks, timings) — Documents in priority order and per-stage
+    milliseconds. Synchronous and CPU-bound: call aretrieve_chunks from
+    async code.
+    """
+    timings = {}
+
+    start = time.perf_counter()
+    sources = []
+    for document_id in document_ids or [latest_document_id()]:
+        entry = get_document(document_id) if document_id else None
+        db = get_db(document_id) if entry else None
+        if db is not None:
+            sources.append((db, entry["index_path"]))
+    timings["load_ms"] = _elapsed_ms(start)
+
+    if not sources:
         print("Vector DB not initialized")
-        return ""
+        return [], timings
+
+    topic = normalize_topic(topic)
+    if topic is not None:
+        vector = None
+        if TOPIC_SEARCH_MODE != "lexical":
+            start = time.perf_counter()
+            vector = topic_vector(topic)
+            timings["embed_ms"] = _elapsed_ms(start)
+
+        start = time.perf_counter()
+        if TOPIC_SEARCH_MODE == "vector":
+            docs = _topic_search(sources, vector, k, sections, rng or random)
+        else:
+            docs = _ranked_search(sources, topic, vector, k, sections, rng or random)
+        timings["search_ms"] = _elapsed_ms(start)
+
+        # A topic with no lexical matches falls back to topic-free retrieval
+        if docs:
+            return docs, timings
+
+    if RETRIEVAL_STRATEGY == "coverage" and rng is None:
+        start = time.perf_counter()
+        sampled = _coverage_sample(sources, k, sections)
+        if sampled is not None:
+            random.shuffle(sampled)
+            timings["sample_ms"] = _elapsed_ms(start)
+            return sampled, timings
+
+    rng = rng or random
 
     # Pick 4 random distinct queries from the pool
-    queries = random.sample(_QUERY_POOL, min(4, len(_QUERY_POOL)))
+    queries = rng.sample(_QUERY_POOL, min(4, len(_QUERY_POOL)))
 
-    seen_contents = set()
-    all_docs = []
+    # Stack the (precomputed) query vectors into one matrix
+    start = time.perf_counter()
+    matrix = np.array(
+        [query_pool_vectors(sources[0][1])[query] for query in queries],
+        dtype=np.float32,
+    )
+    timings["embed_ms"] = _elapsed_ms(start)
 
-    for query in queries:
+    start = time.perf_counter()
+    batches = []
+    for db, _ in sources:
         try:
-            docs = db.similarity_search(query, k=12)
-            for doc in docs:
-                # Deduplicate by first 80 chars of content
-                key = doc.page_content[:80]
-                if key not in seen_contents:
-                    seen_contents.add(key)
-                    all_docs.append(doc)
+            batches += _search_batch(
+                db, matrix.copy(), k=max(12, k), sections=sections
+            )
         except Exception as e:
-            print(f"Retrieval error for query '{query}': {e}")
+            print(f"Retrieval error: {e}")
+    timings["search_ms"] = _elapsed_ms(start)
+
+    start = time.perf_counter()
+    seen_contents = set()
+    all_docs = []
+    for docs in batches:
+        for doc in docs:
+            # Deduplicate by first 80 chars of content
+            key = doc.page_content[:80]
+            if key not in seen_contents:
+                seen_contents.add(key)
+                all_docs.append(doc)
+    timings["dedupe_ms"] = _elapsed_ms(start)
 
     if not all_docs:
-        return ""
+        return [], timings
+
+    start = time.perf_counter()
 
     # Randomly sample k chunks from the deduplicated pool
-    sampled = random.sample(all_docs, min(k, len(all_docs)))
+    sampled = rng.sample(all_docs, min(k, len(all_docs)))
 
     # Shuffle order so context arrangement differs each time
-    random.shuffle(sampled)
+    rng.shuffle(sampled)
+    timings["sample_ms"] = _elapsed_ms(start)
+
+    return sampled, timings
+
+
+def retrieve_context(k: int = 8, document_ids=None, sections=None, topic=None, rng=None):
+    docs, timings = retrieve_chunks(k, document_ids, sections, topic, rng)
+    return "\n\n---\n\n".join(doc.page_content for doc in docs), timings
+
+
+async def aretrieve_chunks(k: int = 8, document_ids=None, sections=None, topic=None, rng=None):
+    # FAISS search and docstore lookups run in a worker thread so the
+    # event loop keeps serving other requests
+    return await asyncio.to_thread(
+        retrieve_chunks, k, document_ids, sections, topic, rng
+    )
+
 
-    return "\n\n---\n\n".join(doc.page_content for doc in sampled)
\ No newline at end of file
+async def aretrieve_context(k: int = 8, document_ids=None, sections=None, topic=None):
+    return await asyncio.to_thread(
+        retrieve_context, k, document_ids, sections, topic
+    )
@@ -0,0 +1,183 @@
+import json
+import math
+import os
+import random
+import threading
+
+from core.config import SAMPLER_MIN_SECTIONS, SAMPLER_POSITION_BUCKETS
+from rag.doc_cache import write_json
+
+USAGE_FILE = "usage.json"
+
+# index_path → CoverageSampler
+_samplers = {}
+_samplers_lock = threading.Lock()
+
+
+# -----------------------------
+# STRATUM
+# -----------------------------
+class _Stratum:
+    """
+    Chunks of one section (or position bucket) grouped by usage count.
+    Each level is a list with swap-remove, so taking a least-used chunk
+    and moving it up a level are both O(1).
+    """
+
+    def __init__(self, chunks, counts):
+        self.levels = {}   # usage count → chunk positions
+        self.slot = {}     # chunk position → index within its level list
+        self.size = len(chunks)
+
+        for chunk in chunks:
+            self._add(chunk, counts[chunk])
+
+        self.min_level = min(self.levels)
+
+    def _add(self, chunk, level):
+        bucket = self.levels.setdefault(level, [])
+        self.slot[chunk] = len(bucket)
+        bucket.append(chunk)
+
+    def _remove(self, chunk, level):
+        bucket = self.levels[level]
+        i = self.slot.pop(chunk)
+        last = bucket.pop()
+        if last != chunk:
+            bucket[i] = last
+            self.slot[last] = i
+        if not bucket:
+            del self.levels[level]
+
+    def take(self, counts, rng):
+        # Uniform among the least-used chunks; the chunk stays out of the
+        # stratum until put_back, so one quiz never gets it twice
+        bucket = self.levels[self.min_level]
+        chunk = bucket[rng.randrange(len(bucket))]
+        self._remove(chunk, counts[chunk])
+        self._refresh_min()
+        return chunk
+
+    def put_back(self, chunk, counts):
+        counts[chunk] += 1
+        self._add(chunk, counts[chunk])
+        self._refresh_min()
+
+    def _refresh_min(self):
+        # Draws only ever move chunks from the lowest level up by one, so
+        # there are at most two levels and this min is cheap
+        self.min_level = min(self.levels) if self.levels else math.inf
+
+
+# -----------------------------
+# SAMPLER
+# -----------------------------
+class CoverageSampler:
+    """
+    Per-document chunk sampler that spreads quizzes over the whole
+    document. Chunks are stratified by section (when the document has at
+    least SAMPLER_MIN_SECTIONS) or by position; every draw prefers the
+    least-covered strata and, within a stratum, the least-used chunks.
+    Usage counts persist next to the index. Only the docstore is read —
+    no vector search.
+    """
+
+    def __init__(self, index_path, db):
+        self.path = os.path.join(index_path, USAGE_FILE)
+        self.docstore_ids = [
+            db.index_to_docstore_id[i] for i in range(len(db.index_to_docstore_id))
+        ]
+        self.counts = self._load_counts(len(self.docstore_ids))
+        self._lock = threading.Lock()
+
+        metadatas = [db.docstore.search(d).metadata for d in self.docstore_ids]
+        sections = {m.get("section") for m in metadatas if m.get("section")}
+        self.by_section = len(sections) >= SAMPLER_MIN_SECTIONS
+
+        groups = {}
+        if self.by_section:
+            for position, metadata in enumerate(metadatas):
+                groups.setdefault(metadata.get("section") or "", []).append(position)
+        else:
+            order = sorted(
+                range(len(metadatas)),
+                key=lambda p: metadatas[p].get("chunk_index", p),
+            )
+            buckets = max(1, min(len(order), SAMPLER_POSITION_BUCKETS))
+            for rank, position in enumerate(order):
+                groups.setdefault(rank * buckets // len(order), []).append(position)
+
+        self.strata = {
+            name: _Stratum(chunks, self.counts) for name, chunks in groups.items()
+        }
+
+    def _load_counts(self, size):
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                counts = json.load(f)
+            if len(counts) == size:
+                return counts
+        return [0] * size
+
+    def _save_counts(self):
+        write_json(self.path, self.counts)
+
+    def sample(self, k, sections=None, rng=random):
+        """
+        Docstore ids of k distinct chunks. Each pick comes from the stratum
+        with the least-used chunks left, ties going to strata this call has
+        drawn from least — so every chunk is used once before any repeats,
+        and one quiz spreads over as many sections/regions as possible.
+        sections limits section strata.
+        """
+        with self._lock:
+            strata = [
+                stratum for name, stratum in self.strata.items()
+                if not sections or name in sections
+            ]
+            k = min(k, sum(stratum.size for stratum in strata))
+
+            drawn = {id(stratum): 0 for stratum in strata}
+            taken = []
+            while len(taken) < k:
+                stratum = min(
+                    strata,
+                    key=lambda s: (s.min_level, drawn[id(s)], rng.random()),
+                )
+                taken.append((stratum, stratum.take(self.counts, rng)))
+                drawn[id(stratum)] += 1
+
+            for stratum, chunk in taken:
+                stratum.put_back(chunk, self.counts)
+
+            if taken:
+                self._save_counts()
+
+            return [self.docstore_ids[chunk] for _, chunk in taken]
+
+    def matches(self, db):
+        # A rebuilt index has new docstore ids — its sampler starts over
+        return (
+            len(self.docstore_ids) == len(db.index_to_docstore_id)
+            and self.docstore_ids[:1] == [db.index_to_docstore_id.get(0)]
+        )
+
+    def stats(self):
+        with self._lock:
+            used = sum(1 for count in self.counts if count)
+            return {
+                "chunks": len(self.counts),
+                "used": used,
+                "coverage": round(used / len(self.counts), 4) if self.counts else 0.0,
+                "strata": len(self.strata),
+                "by_section": self.by_section,
+            }
+
+
+def get_sampler(index_path, db):
+    with _samplers_lock:
+        sampler = _samplers.get(index_path)
+        if sampler is None or not sampler.matches(db):
+            sampler = CoverageSampler(index_path, db)
+            _samplers[index_path] = sampler
+        return sampler
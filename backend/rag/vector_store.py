@@ -1,31 +1,218 @@
+import json
 import os
+import threading
+import time
+from collections import OrderedDict
+
 from langchain_community.vectorstores import FAISS
-from core.config import VECTOR_DB_PATH
+from core.config import LIBRARY_PATH, INDEX_CACHE_MAX_BYTES
 from core.llm import embeddings
+from rag.doc_cache import write_json
+from rag.index_factory import apply_search_params
+
+# document_id → library entry (name, mode, index_path, chunks, ...)
+# document_id is the SHA-256 of the uploaded bytes, so one PDF is one document
+_library = None
+
+# Resident indexes, least-recently-used first: document_id → (db, bytes)
+_loaded = OrderedDict()
+_loaded_bytes = 0
+
+_lock = threading.RLock()
+
+
+# -----------------------------
+# FAISS PERSISTENCE
+# -----------------------------
+def save_db(db, path):
+    db.save_local(path)
+
+
+def load_index(path):
+    db = FAISS.load_local(
+        path,
+        embeddings,
+        allow_dangerous_deserialization=True,
+    )
+    apply_search_params(db.index)
+    return db
+
+
+def _index_bytes(path):
+    # On-disk size of index.faiss + index.pkl tracks resident memory closely
+    return sum(
+        os.path.getsize(os.path.join(path, name))
+        for name in ("index.faiss", "index.pkl")
+        if os.path.exists(os.path.join(path, name))
+    )
+
+
+# -----------------------------
+# DOCUMENT LIBRARY
+# -----------------------------
+def _get_library():
+    global _library
+
+    if _library is None:
+        if os.path.exists(LIBRARY_PATH):
+            with open(LIBRARY_PATH, encoding="utf-8") as f:
+                _library = json.load(f)
+        else:
+            _library = {}
+    return _library
+
+
+def _save_library():
+    write_json(LIBRARY_PATH, _library, indent=1)
+
+
+def register_document(document_id, name, mode, index_path, chunks, db=None):
+    """
+    Add or update a library entry. Passing the freshly built db makes it
+    resident right away instead of reloading it on the first quiz.
+    """
+    with _lock:
+        library = _get_library()
+        now = time.time()
+        entry = library.get(document_id, {"created_at": now})
+        previous_path = entry.get("index_path")
+        entry.update({
+            "document_id": document_id,
+            "name": name,
+            "mode": mode,
+            "index_path": index_path,
+            "chunks": chunks,
+            "updated_at": now,
+        })
+        library[document_id] = entry
+        _save_library()
+
+        # A resident copy is stale if it came from another index_path
+        # (other mode/config) or is being replaced by a fresh build
+        if previous_path != index_path or db is not None:
+            _evict(document_id)
+        if db is not None:
+            _admit(document_id, db, _index_bytes(index_path))
+
+    return entry
+
+
+def get_document(document_id):
+    with _lock:
+        return _get_library().get(document_id)
+
+
+def list_documents():
+    with _lock:
+        return sorted(
+            _get_library().values(),
+            key=lambda entry: entry["updated_at"],
+            reverse=True,
+        )
+
+
+def latest_document_id():
+    documents = list_documents()
+    return documents[0]["document_id"] if documents else None
+
+
+# -----------------------------
+# RESIDENT INDEX LRU
+# -----------------------------
+def _evict(document_id):
+    global _loaded_bytes
+
+    if document_id in _loaded:
+        _, size = _loaded.pop(document_id)
+        _loaded_bytes -= size
+
+
+def _admit(document_id, db, size):
+    global _loaded_bytes
+
+    _loaded[document_id] = (db, size)
+    _loaded_bytes += size
+
+    # Evict cold indexes until under budget, but always keep the new one
+    while _loaded_bytes > INDEX_CACHE_MAX_BYTES and len(_loaded) > 1:
+        cold_id = next(iter(_loaded))
+        _evict(cold_id)
+
+
+def get_db(document_id=None):
+    """
+    FAISS index for a document (default: the most recently parsed one).
+    Loaded from disk on first use and kept in a memory-bounded LRU.
+    Returns None for unknown documents.
+    """
+    if document_id is None:
+        document_id = latest_document_id()
+
+    with _lock:
+        if document_id in _loaded:
+            _loaded.move_to_end(document_id)
+            return _loaded[document_id][0]
 
-vector_db = None
+        entry = _get_library().get(document_id)
+        if entry is None or not os.path.exists(entry["index_path"]):
+            return None
 
+        db = load_index(entry["index_path"])
+        _admit(document_id, db, _index_bytes(entry["index_path"]))
+        return db
 
-def save_db(db):
-    db.save_local(VECTOR_DB_PATH)
 
+def list_sections(document_id):
+    """
+    Sections of a structure-chunked document in reading order, with chunk
+    counts and page spans. Returns None for unknown documents.
+    """
+    db = get_db(document_id)
+    if db is None:
+        return None
 
-def load_db():
-    global vector_db
+    sections = {}
+    for doc_id in db.index_to_docstore_id.values():
+        metadata = db.docstore.search(doc_id).metadata
+        name = metadata.get("section")
+        # Chunks outside any named section (text before the first
+        # heading) are not a section a quiz can be filtered to
+        if not name:
+            continue
 
-    if os.path.exists(VECTOR_DB_PATH):
-        vector_db = FAISS.load_local(
-            VECTOR_DB_PATH,
-            embeddings,
-            allow_dangerous_deserialization=True,
+        section = sections.setdefault(name, {
+            "section": name,
+            "chunks": 0,
+            "page_start": None,
+            "page_end": None,
+            "first_chunk": metadata.get("chunk_index", 0),
+        })
+        section["chunks"] += 1
+        section["first_chunk"] = min(
+            section["first_chunk"], metadata.get("chunk_index", 0)
         )
-    return vector_db
 
+        if metadata.get("page_start") is not None:
+            section["page_start"] = min(
+                p for p in (section["page_start"], metadata["page_start"])
+                if p is not None
+            )
+            section["page_end"] = max(
+                p for p in (section["page_end"], metadata["page_end"])
+                if p is not None
+            )
 
-def set_db(db):
-    global vector_db
-    vector_db = db
+    ordered = sorted(sections.values(), key=lambda s: s["first_chunk"])
+    for section in ordered:
+        del section["first_chunk"]
+    return ordered
 
 
-def get_db():
-    return vector_db
\ No newline at end of file
+def cache_stats():
+    with _lock:
+        return {
+            "documents": len(_get_library()),
+            "resident": len(_loaded),
+            "resident_bytes": _loaded_bytes,
+            "max_bytes": INDEX_CACHE_MAX_BYTES,
+        }
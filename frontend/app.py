@@ -1,3 +1,6 @@
+import json
+import time
+
 import streamlit as st
 import requests
 
@@ -6,7 +9,9 @@ import requests
 # ==================================
 API_PARSE = "http://127.0.0.1:8000/parse-document"
 API_GENERATE = "http://127.0.0.1:8000/generate-quiz"
+API_GENERATE_STREAM = "http://127.0.0.1:8000/generate-quiz/stream"
 API_SUBMIT = "http://127.0.0.1:8000/submit-quiz"
+API_JOBS = "http://127.0.0.1:8000/jobs"
 
 st.set_page_config(
     page_title="Quizify · AI Quiz Agent",
@@ -469,6 +474,7 @@ hr { border-color: rgba(201,169,110,0.1) !important; }
 # ==================================
 defaults = {
     "document_ready": False,
+    "document_id": None,
     "quiz": None,
     "quiz_id": None,
     "quiz_generated": False,
@@ -517,6 +523,16 @@ with left_col:
         """, unsafe_allow_html=True)
 
     if uploaded_file:
+        parse_mode = st.selectbox(
+            "Parsing Mode",
+            ["auto", "fast", "full"],
+            help=(
+                "auto: text layer for born-digital pages, full pipeline for "
+                "scanned pages · fast: text layer only · full: layout, "
+                "tables and OCR on every page"
+            ),
+        )
+
         if st.button("Parse Document →", use_container_width=True):
             with st.spinner("Parsing your document..."):
                 files = {
@@ -526,10 +542,30 @@ with left_col:
                         uploaded_file.type,
                     )
                 }
-                response = requests.post(API_PARSE, files=files)
+                response = requests.post(
+                    API_PARSE, files=files, data={"mode": parse_mode}
+                )
                 if response.status_code == 200:
-                    st.session_state.document_ready = True
-                    st.rerun()
+                    job_id = response.json()["job_id"]
+                    progress = st.progress(0.0, text="Queued...")
+
+                    # Ingestion runs in the background — poll until it settles
+                    while True:
+                        job = requests.get(f"{API_JOBS}/{job_id}").json()
+                        progress.progress(
+                            min(float(job.get("progress", 0.0)), 1.0),
+                            text=f"{job.get('stage', 'working').capitalize()}...",
+                        )
+                        if job.get("status") in ("done", "failed"):
+                            break
+                        time.sleep(1)
+
+                    if job.get("status") == "done":
+                        st.session_state.document_ready = True
+                        st.session_state.document_id = job["result"]["document_id"]
+                        st.rerun()
+                    else:
+                        st.error(f"Parsing failed: {job.get('error')}")
                 else:
                     st.error("Backend connection failed.")
 
@@ -544,6 +580,11 @@ with left_col:
         </div>
         """, unsafe_allow_html=True)
 
+        topic = st.text_input(
+            "Topic (optional)",
+            placeholder="e.g. photosynthesis — leave blank for the whole document",
+        )
+
         num_questions = st.number_input(
             "Number of Questions",
             min_value=1, max_value=20, value=5
@@ -559,21 +600,52 @@ with left_col:
             ["MCQ", "True/False", "Short Answer"]
         )
 
+        quiz_code = st.text_input(
+            "Quiz code (optional)",
+            placeholder="e.g. 1234 — same code, same quiz for everyone",
+        )
+
         st.markdown("<div style='height:0.75rem'></div>", unsafe_allow_html=True)
 
         if st.button("Generate Quiz ✦", use_container_width=True):
             with st.spinner("Crafting your quiz..."):
                 payload = {
-                    "topic": "full document",
+                    "topic": topic.strip() or "full document",
                     "num_questions": num_questions,
                     "difficulty": difficulty,
                     "question_type": question_type,
+                    "document_ids": [st.session_state.document_id],
                 }
-                res = requests.post(API_GENERATE, json=payload)
+                if quiz_code.strip().isdigit():
+                    payload["seed"] = int(quiz_code.strip())
+                questions, quiz_id, error = [], None, None
+                res = requests.post(API_GENERATE_STREAM, json=payload, stream=True)
                 if res.status_code == 200:
-                    data = res.json()
-                    st.session_state.quiz = data["questions"]
-                    st.session_state.quiz_id = data["quiz_id"]
+                    # Questions arrive one NDJSON line at a time — preview
+                    # each in the quiz column as soon as it is written
+                    preview = right_col.container()
+
+                    for line in res.iter_lines():
+                        if not line:
+                            continue
+                        event = json.loads(line)
+                        if event["type"] == "quiz":
+                            quiz_id = event["quiz_id"]
+                        elif event["type"] == "question":
+                            questions.append(event["question"])
+                            preview.markdown(
+                                f"**{len(questions)}.** {event['question']['question']}"
+                            )
+                        elif event["type"] == "error":
+                            error = event["error"]
+
+                if res.status_code != 200 or error or not questions:
+                    if res.headers.get("content-type", "").startswith("application/json"):
+                        error = res.json().get("error")
+                    st.error(f"Quiz generation failed: {error}" if error else "Quiz generation failed.")
+                else:
+                    st.session_state.quiz = questions
+                    st.session_state.quiz_id = quiz_id
                     st.session_state.quiz_generated = True
                     st.session_state.submitted_result = None
                     # clear old answers
@@ -581,8 +653,6 @@ with left_col:
                         if k.startswith("q_"):
                             del st.session_state[k]
                     st.rerun()
-                else:
-                    st.error("Quiz generation failed.")
 
         st.markdown("<div style='height:1.5rem'></div>", unsafe_allow_html=True)
 